@@ -0,0 +1,150 @@
+"""
+Benchmark of adaptive against fixed poll intervals
+
+Replays a simulated day of a fleet in virtual time: units are switched on
+from Home Assistant in the morning, cool down towards their setpoint, hold
+it, get a setpoint change and are switched off in the evening, some units
+stay off all day and some are switched by the remote. Reports the polls per
+unit and day, the average interval and how long it takes until a poll shows
+a command or a change made by the remote.
+
+    python benchmarks/bench_adaptive.py --units 100 --interval 60
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi import schedule  # noqa: E402
+from custom_components.zhimi.airconditioning import AirConditionStatus  # noqa: E402
+
+DAY = 24 * 3600
+
+
+class VirtualClock:
+    """Stand-in for the time module of schedule, in simulated seconds."""
+
+    now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Unit:
+    """Power and temperature of one simulated air condition over the day."""
+
+    def __init__(self, rng):
+        self.on_at = rng.uniform(7, 9) * 3600
+        self.off_at = rng.uniform(17, 19) * 3600
+        self.change_at = rng.uniform(12, 14) * 3600
+        self.remote = rng.random() < 0.2
+        self.idle = rng.random() < 0.3
+        self.setpoint = 26.0
+        self.rate = rng.uniform(20, 40)  # seconds per 0.1 degree
+
+    def events(self):
+        """(time, by remote) of every change made to the unit."""
+        if self.idle:
+            return []
+        return [(self.on_at, self.remote), (self.change_at, False),
+                (self.off_at, self.remote)]
+
+    def status(self, now):
+        if self.idle or not self.on_at <= now < self.off_at:
+            return AirConditionStatus({'power': 'off', 'temp_dec': 300,
+                                       'st_temp_dec': 260})
+        setpoint = 25.0 if now >= self.change_at else self.setpoint
+        start = 30.0 if now < self.change_at else self.setpoint
+        since = now - (self.change_at if now >= self.change_at else self.on_at)
+        temperature = max(setpoint, start - int(since / self.rate) / 10)
+        return AirConditionStatus({'power': 'on',
+                                   'temp_dec': round(temperature * 10),
+                                   'st_temp_dec': round(setpoint * 10)})
+
+
+def simulate(units, interval, adaptive, args):
+    clock = VirtualClock()
+    schedule.time = clock
+    queue = []
+    intervals = []
+    delays = {False: [], True: []}
+    rng = random.Random(1)
+
+    for index, unit in enumerate(units):
+        key = 'unit-%d' % index
+        adaptive_interval = schedule.AdaptiveInterval(
+            interval, args.min_interval, args.max_interval)
+        state = {'unit': unit, 'key': key, 'interval': adaptive_interval,
+                 'pending': [], 'last_poll': None}
+        for at, remote in unit.events():
+            heapq.heappush(queue, (at, 'change', index, remote))
+        state['next'] = schedule.next_poll_delay(
+            0, schedule.poll_phase(key, interval), interval, 0) + rng.uniform(0, 0.5)
+        heapq.heappush(queue, (state['next'], 'poll', index, None))
+        units[index] = state
+
+    polls = 0
+    while queue:
+        now, kind, index, remote = heapq.heappop(queue)
+        if now > DAY:
+            break
+        clock.now = now
+        state = units[index]
+        current = adaptive and state['interval'].interval or interval
+        if kind == 'change':
+            state['pending'].append((now, remote))
+            if adaptive and not remote:
+                # A command from Home Assistant reschedules the next poll.
+                state['interval'].boost()
+                current = state['interval'].interval
+                at = now + schedule.next_poll_delay(
+                    now, schedule.poll_phase(state['key'], current), current, 0.5)
+                if at < state['next']:
+                    state['next'] = at
+                    heapq.heappush(queue, (at, 'poll', index, None))
+            continue
+
+        if now != state['next']:
+            continue  # superseded by a rescheduled poll
+        polls += 1
+        if state['last_poll'] is not None:
+            intervals.append(now - state['last_poll'])
+        state['last_poll'] = now
+        for changed_at, by_remote in state['pending']:
+            delays[by_remote].append(now - changed_at)
+        state['pending'] = []
+        if adaptive:
+            current = state['interval'].update(state['unit'].status(now))
+        state['next'] = now + schedule.next_poll_delay(
+            now, schedule.poll_phase(state['key'], current), current, 0.5)
+        heapq.heappush(queue, (state['next'], 'poll', index, None))
+
+    return polls, intervals, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, default=100)
+    parser.add_argument('--interval', type=float, default=60)
+    parser.add_argument('--min-interval', type=float,
+                        default=schedule.DEFAULT_MIN_POLL_INTERVAL)
+    parser.add_argument('--max-interval', type=float,
+                        default=schedule.DEFAULT_MAX_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    for label, adaptive in (('fixed', False), ('adaptive', True)):
+        rng = random.Random(0)
+        units = [Unit(rng) for _ in range(args.units)]
+        polls, intervals, delays = simulate(units, args.interval, adaptive, args)
+        print("%-8s %6.0f polls/unit/day  average interval %6.1f s  "
+              "command seen after %5.1f s  remote change seen after %6.1f s" % (
+                  label, polls / args.units, statistics.mean(intervals),
+                  statistics.mean(delays[False]), statistics.mean(delays[True])))
+
+
+if __name__ == '__main__':
+    main()
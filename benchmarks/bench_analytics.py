@@ -0,0 +1,104 @@
+"""
+Benchmark of the daily energy and runtime analytics
+
+Writes one year of samples for a fleet of air conditions into their
+columnar histories and measures reading every history back and aggregating
+it into daily runtime, compressor duty cycle, energy and time to setpoint.
+
+    python benchmarks/bench_analytics.py --units 50 --days 365 --interval 60
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.analytics import daily_stats  # noqa: E402
+from custom_components.zhimi.history import (  # noqa: E402
+    COLUMNS,
+    DeviceHistory,
+    ROW_SIZE,
+)
+
+START = 1577836800  # 2020-01-01
+
+
+def synthetic_unit(unit, count, interval):
+    """Days of a unit running from morning to night, cooling towards a target."""
+    rng = np.random.default_rng(unit)
+    ts = START + np.arange(count, dtype=np.int64) * interval
+    hour = (ts % 86400) / 3600
+    day = (ts - START) // 86400
+    start_hour = 7 + rng.integers(0, 3, day[-1] + 1)[day]
+    power = (hour >= start_hour) & (hour < 23)
+    target = np.where(rng.random(day[-1] + 1) < 0.3, 240, 260)[day]
+    since_on = np.clip(hour - start_hour, 0, None)
+    temperature = target + 40 * np.exp(-since_on * 2)
+    temperature = np.where(power, temperature, 300)
+    columns = {
+        'ts': ts,
+        'temperature': temperature + rng.normal(0, 2, count),
+        'target': target,
+        'power': power.astype(np.uint8),
+        'mode': np.ones(count),
+        'fan_speed': np.full(count, 5),
+        'compressor_frq': np.where(
+            power, np.clip(20 + (temperature - target) * 2, 0, 90), 0),
+    }
+    return {name: columns[name].astype(dtype) for name, dtype, _, _ in COLUMNS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--interval', type=int, default=60)
+    parser.add_argument('--utc-offset', type=int, default=8 * 3600)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='zhimi_analytics_')
+    try:
+        rows = args.days * 86400 // args.interval
+        histories = []
+        start = time.perf_counter()
+        for unit in range(args.units):
+            history = DeviceHistory(os.path.join(path, str(unit)))
+            history.append_columns(synthetic_unit(unit, rows, args.interval))
+            histories.append(history)
+        elapsed = time.perf_counter() - start
+        print("generated     %d units x %d rows in %.2f s, %.1f MB on disk" % (
+            args.units, rows, elapsed, args.units * rows * ROW_SIZE / 1e6))
+
+        end = START + args.days * 86400
+        read_time = stats_time = 0
+        energy = runtime = 0
+        for history in histories:
+            start = time.perf_counter()
+            columns = history.read(START, end)
+            read_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            stats = daily_stats(columns, utc_offset=args.utc_offset)
+            stats_time += time.perf_counter() - start
+            energy += stats['energy_kwh'].sum()
+            runtime += stats['runtime_hours'].sum()
+
+        print("read          %.2f s" % read_time)
+        print("daily stats   %.2f s = %.0f rows/s" % (
+            stats_time, args.units * rows / stats_time))
+        print("fleet total   %.2f s for %d unit-days" % (
+            read_time + stats_time, args.units * args.days))
+        print("fleet energy  %.0f kWh over %.0f runtime hours, last day of the last unit: %s" % (
+            energy, runtime, {key: float(np.round(value[-1], 2))
+                              for key, value in stats.items() if key != 'day'}))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark of the precompiled miIO codec against construct
+
+Times encode+decode of a get_prop request and its reply with
+miio.protocol.Message and with MiIOCodec, then polls a simulated fleet
+running in a separate process with either codec in the transport and
+reports the CPU time this process spends per fleet poll. Runs fully
+offline on loopback addresses (Linux).
+
+    python benchmarks/bench_codec.py --units 100 --polls 20
+"""
+import argparse
+import asyncio
+import calendar
+import datetime
+import os
+import subprocess
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from miio.protocol import Message  # noqa: E402
+
+from custom_components.zhimi import transport  # noqa: E402
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirCondition,
+    PROPERTY_TIERS,
+    STATUS_PROPERTIES,
+)
+from custom_components.zhimi.codec import MiIOCodec, codec_for  # noqa: E402
+from simulator import INITIAL_PROPERTIES  # noqa: E402
+
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+DEVICE_ID = b'\x0f\x00\x00\x01'
+REQUEST = {"id": 1234, "method": "get_prop", "params": STATUS_PROPERTIES}
+REPLY = {"id": 1234,
+         "result": [INITIAL_PROPERTIES[prop] for prop in STATUS_PROPERTIES]}
+
+
+class ConstructCodec:
+    """The codec interface on top of miio.protocol.Message."""
+
+    def __init__(self, token: bytes) -> None:
+        self.token = token
+
+    def encode(self, payload: dict, device_id: bytes, stamp: int) -> bytes:
+        header = {"length": 0, "unknown": 0, "device_id": device_id,
+                  "ts": datetime.datetime.utcfromtimestamp(stamp)}
+        return Message.build(
+            {"data": {"value": payload}, "header": {"value": header},
+             "checksum": 0},
+            token=self.token)
+
+    def decode(self, data: bytes):
+        message = Message.parse(data, token=self.token)
+        header = message.header.value
+        return (header.device_id, calendar.timegm(header.ts.utctimetuple()),
+                message.data.value)
+
+
+def bench_packets(number):
+    token = os.urandom(16)
+    for label, codec in (('construct', ConstructCodec(token)),
+                         ('codec', MiIOCodec(token))):
+        reply = codec.encode(REPLY, DEVICE_ID, 1000)
+
+        def roundtrip():
+            codec.encode(REQUEST, DEVICE_ID, 1000)
+            codec.decode(reply)
+
+        seconds = min(timeit.repeat(roundtrip, number=number, repeat=5)) / number
+        print("%-10s encode+decode %7.1f us per packet pair" % (label, seconds * 1e6))
+
+
+async def poll_fleet(units, polls):
+    devices = [AirCondition(host, token, refresh_tiers=NO_CACHE, command_window=0)
+               for host, token in units]
+    try:
+        await asyncio.gather(*(device.async_status() for device in devices))
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        for _ in range(polls):
+            await asyncio.gather(*(device.async_status() for device in devices))
+        return ((time.process_time() - cpu) / polls,
+                (time.perf_counter() - wall) / polls)
+    finally:
+        for device in devices:
+            device.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, default=100)
+    parser.add_argument('--polls', type=int, default=20)
+    parser.add_argument('--packets', type=int, default=2000)
+    args = parser.parse_args()
+
+    bench_packets(args.packets)
+
+    simulator = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), 'simulator.py'),
+         '--units', str(args.units)],
+        stdout=subprocess.PIPE, text=True,
+        env=dict(os.environ, PYTHONUNBUFFERED='1'))
+    try:
+        units = [simulator.stdout.readline().split() for _ in range(args.units)]
+        for label, factory in (('construct', ConstructCodec), ('codec', codec_for)):
+            transport.codec_for = factory
+            transport._SESSIONS.clear()
+            cpu, wall = asyncio.run(poll_fleet(units, args.polls))
+            print("%-10s fleet poll of %d units: %6.1f ms CPU, %6.1f ms wall" % (
+                label, args.units, cpu * 1000, wall * 1000))
+    finally:
+        transport.codec_for = codec_for
+        simulator.terminate()
+        simulator.wait()
+
+
+if __name__ == '__main__':
+    main()
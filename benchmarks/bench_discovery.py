@@ -0,0 +1,103 @@
+"""
+Benchmark of broadcast discovery against probing every host
+
+Starts a simulated fleet, forgets which host has which token except for an
+inventory keyed by host, and finds all units once by a hello broadcast with
+concurrent miIO.info requests and once by asking one host after the other
+(handshake and miIO.info each). Runs fully offline on loopback addresses
+(Linux).
+
+    python benchmarks/bench_discovery.py --units 100 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from miio import DeviceException  # noqa: E402
+
+from custom_components.zhimi import transport  # noqa: E402
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirCondition,
+    ZHIMI_AC_MA1,
+)
+from custom_components.zhimi.discovery import (  # noqa: E402
+    async_discover,
+    async_identify,
+    inventory_entries,
+)
+from simulator import start_broadcast_responder, start_fleet, stop_fleet  # noqa: E402
+
+BROADCAST = '127.255.255.255'
+
+
+async def probe_hosts(inventory, timeout):
+    found = []
+    for unit in inventory:
+        device = AirCondition(unit['host'], unit['token'])
+        device._transport.timeout = timeout
+        try:
+            info = await device.async_info(retry_count=0)
+        except DeviceException:
+            continue
+        finally:
+            device.close()
+        if info.model == ZHIMI_AC_MA1:
+            found.append(unit['host'])
+    return found
+
+
+async def run(args):
+    fleet = await start_fleet(args.units, args.latency, args.jitter, args.loss)
+    responder = await start_broadcast_responder(fleet, args.port)
+    inventory = [{'host': host, 'token': token, 'name': 'Unit %d' % index}
+                 for index, (host, token, _, _) in enumerate(fleet)
+                 if index >= args.unknown]
+    try:
+        transport._SESSIONS.clear()
+        start = time.perf_counter()
+        devices = await async_discover(BROADCAST, args.timeout, args.port)
+        answered = time.perf_counter() - start
+        devices = await async_identify(devices, inventory, timeout=args.timeout)
+        elapsed = time.perf_counter() - start
+        entries = inventory_entries(devices)
+        assert all(entry['device_id'] == unit.device_id
+                   for entry, (host, _, unit, _) in zip(
+                       entries, fleet[args.unknown:])), "wrong device ids"
+        print("broadcast  %3d of %3d answered,        %3d %s identified in %6.3f s "
+              "(%.3f s collecting replies)" % (
+                  len(devices), args.units, len(entries), ZHIMI_AC_MA1,
+                  elapsed, answered))
+
+        transport._SESSIONS.clear()
+        start = time.perf_counter()
+        found = await probe_hosts(inventory, args.timeout)
+        print("sequential %3d of %3d hosts probed,    %3d %s identified in %6.3f s" % (
+            len(inventory), args.units, len(found), ZHIMI_AC_MA1,
+            time.perf_counter() - start))
+    finally:
+        responder.close()
+        await stop_fleet(fleet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=0.5,
+                        help="seconds to collect hello replies and to wait for miIO.info")
+    parser.add_argument('--unknown', type=int, default=0,
+                        help="units left out of the inventory")
+    parser.add_argument('--port', type=int, default=54320,
+                        help="port of the simulated broadcast")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
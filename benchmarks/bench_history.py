@@ -0,0 +1,105 @@
+"""
+Benchmark of the columnar device history
+
+Ingests one year of 10 second samples of a single air condition and
+measures the ingest rate, the latency of range reads over that year and
+the time of a rollup to 5 minute buckets.
+
+    python benchmarks/bench_history.py --days 365 --interval 10
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.history import (  # noqa: E402
+    COLUMNS,
+    DeviceHistory,
+    ROW_SIZE,
+)
+
+START = 1577836800  # 2020-01-01
+
+
+def synthetic_columns(first, count, interval):
+    ts = START + (first + np.arange(count, dtype=np.int64)) * interval
+    phase = (ts % 86400) / 86400 * 2 * np.pi
+    columns = {
+        'ts': ts,
+        'temperature': 260 + 30 * np.sin(phase),
+        'target': np.full(count, 260),
+        'power': (np.sin(phase) > -0.3).astype(np.uint8),
+        'mode': np.ones(count),
+        'fan_speed': np.full(count, 5),
+        'compressor_frq': np.clip(40 + 30 * np.sin(phase), 0, None),
+    }
+    return {name: columns[name].astype(dtype) for name, dtype, _, _ in COLUMNS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--interval', type=int, default=10)
+    parser.add_argument('--chunk', type=int, default=8640)
+    parser.add_argument('--samples', type=int, default=100000,
+                        help="samples for the per-sample append benchmark")
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='zhimi_history_')
+    try:
+        history = DeviceHistory(os.path.join(path, 'bulk'))
+        rows = args.days * 86400 // args.interval
+        start = time.perf_counter()
+        for first in range(0, rows, args.chunk):
+            history.append_columns(synthetic_columns(
+                first, min(args.chunk, rows - first), args.interval))
+        elapsed = time.perf_counter() - start
+        print("bulk ingest   %d rows in %.2f s = %.0f rows/s, %.1f MB on disk" % (
+            rows, elapsed, rows / elapsed, rows * ROW_SIZE / 1e6))
+
+        single = DeviceHistory(os.path.join(path, 'single'))
+        start = time.perf_counter()
+        for index in range(args.samples):
+            single.append(START + index * args.interval, 24.5, 26.0, 'on',
+                          'cooling', 5, 40)
+            if single.pending >= 60:
+                single.flush()
+        single.flush()
+        elapsed = time.perf_counter() - start
+        print("append+flush  %d rows in %.2f s = %.0f rows/s" % (
+            args.samples, elapsed, args.samples / elapsed))
+
+        end_ts = START + rows * args.interval
+        for label, span in (('1 hour', 3600), ('1 day', 86400),
+                            ('1 week', 7 * 86400), ('30 days', 30 * 86400),
+                            ('1 year', args.days * 86400)):
+            samples = []
+            for _ in range(args.queries):
+                first = random.randint(START, max(START, end_ts - span))
+                query = time.perf_counter()
+                result = history.read(first, first + span)
+                samples.append(time.perf_counter() - query)
+            print("read %-8s %7d rows  p50=%8.3f ms  max=%8.3f ms" % (
+                label, len(result['ts']), statistics.median(samples) * 1000,
+                max(samples) * 1000))
+
+        start = time.perf_counter()
+        rolled = history.rollup(300, end_ts - 30 * 86400)
+        elapsed = time.perf_counter() - start
+        print("rollup        %d rows into %d buckets in %.2f s" % (
+            rolled, len(history.rollup_series(300)), elapsed))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Network benchmark of AirCondition against the local simulator
+
+Measures status() latency, command throughput and the time to poll the
+whole fleet for 1, 10 and 100 simulated zhimi.aircondition.ma1 units.
+Runs fully offline on loopback addresses (Linux).
+
+    python benchmarks/bench_network.py --latency 0.02 --jitter 0.005
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirCondition,
+    PROPERTY_TIERS,
+)
+from simulator import start_fleet, stop_fleet  # noqa: E402
+
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def bench_status(device, polls):
+    samples = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        await device.async_status()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def bench_commands(device, commands):
+    start = time.perf_counter()
+    for index in range(commands):
+        await device.async_set_lcd_level(index % 6)
+    return commands / (time.perf_counter() - start)
+
+
+async def bench_fleet(devices, polls, parallel):
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def poll(device):
+        async with semaphore:
+            await device.async_status()
+
+    samples = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        await asyncio.gather(*(poll(device) for device in devices))
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(args):
+    for units in args.units:
+        fleet = await start_fleet(units, args.latency, args.jitter,
+                                  args.loss, args.max_props)
+        devices = [
+            AirCondition(host, token, refresh_tiers=NO_CACHE, command_window=0)
+            for host, token, _, _ in fleet
+        ]
+        try:
+            await devices[0].async_status()  # handshake and batch probe
+            status = await bench_status(devices[0], args.polls)
+            throughput = await bench_commands(devices[0], args.commands)
+            fleet_polls = await bench_fleet(devices, args.polls, args.parallel)
+        finally:
+            for device in devices:
+                device.close()
+            await stop_fleet(fleet)
+
+        print("%3d units  status p50=%6.1f ms p95=%6.1f ms  "
+              "commands=%7.1f/s  fleet poll p50=%7.1f ms p95=%7.1f ms" % (
+                  units,
+                  statistics.median(status) * 1000,
+                  percentile(status, 0.95) * 1000,
+                  throughput,
+                  statistics.median(fleet_polls) * 1000,
+                  percentile(fleet_polls, 0.95) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--max-props', type=int, default=None)
+    parser.add_argument('--polls', type=int, default=20)
+    parser.add_argument('--commands', type=int, default=50)
+    parser.add_argument('--parallel', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
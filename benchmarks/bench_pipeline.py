@@ -0,0 +1,96 @@
+"""
+Benchmark of pipelined against serial miIO requests
+
+Runs a status() needing several get_prop requests (the simulated firmware
+answers at most --max-props properties per request) and a scene of
+independent set_* commands through async_apply(), once with a pipeline
+window of 1 (serial) and once per --windows value. Runs fully offline on
+the local simulator with added latency and optional packet loss.
+
+    python benchmarks/bench_pipeline.py --latency 0.02 --max-props 3 --loss 0.02
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirCondition,
+    PROPERTY_TIERS,
+)
+from bench_network import percentile  # noqa: E402
+from simulator import start_fleet, stop_fleet  # noqa: E402
+
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+
+SCENES = [
+    {'swing': 'off', 'swing_range': 40, 'swing_angle': 30, 'volume': 'on',
+     'lcd_level': 2, 'idle_timer': 60, 'open_timer': 30, 'fan_speed': 2},
+    {'swing': 'on', 'swing_range': 60, 'swing_angle': 10, 'volume': 'off',
+     'lcd_level': 4, 'idle_timer': 0, 'open_timer': 0, 'fan_speed': 5},
+]
+
+
+async def bench(device, polls, scenes):
+    status = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        await device.async_status()
+        status.append(time.perf_counter() - start)
+
+    apply = []
+    for index in range(scenes):
+        start = time.perf_counter()
+        await device.async_apply(SCENES[index % len(SCENES)])
+        apply.append(time.perf_counter() - start)
+    return status, apply
+
+
+async def run(args):
+    fleet = await start_fleet(1, args.latency, args.jitter, args.loss,
+                              args.max_props)
+    host, token, unit, _ = fleet[0]
+    try:
+        for window in [1] + args.windows:
+            device = AirCondition(host, token, refresh_tiers=NO_CACHE,
+                                  command_window=0, pipeline_window=window)
+            device._transport.timeout = args.timeout
+            await device.async_status()  # handshake and batch probe
+            requests = unit.requests
+            status, apply = await bench(device, args.polls, args.scenes)
+            device.close()
+            print("window %2d  status p50=%7.1f ms p95=%7.1f ms  "
+                  "apply of %d commands p50=%7.1f ms p95=%7.1f ms  "
+                  "requests=%d retries=%d" % (
+                      window,
+                      statistics.median(status) * 1000,
+                      percentile(status, 0.95) * 1000,
+                      len(SCENES[0]),
+                      statistics.median(apply) * 1000,
+                      percentile(apply, 0.95) * 1000,
+                      unit.requests - requests,
+                      sum(device.metrics.retries.values())))
+    finally:
+        await stop_fleet(fleet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--max-props', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=0.5)
+    parser.add_argument('--windows', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--polls', type=int, default=20)
+    parser.add_argument('--scenes', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
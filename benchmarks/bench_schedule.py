@@ -0,0 +1,92 @@
+"""
+Benchmark of aligned against phase-spread fleet polls
+
+Polls a simulated fleet for a few intervals, once with every unit polled at
+the same tick (the old fleet timer) and once with each unit at its own
+phase from poll_phase(), and reports the peak number of miIO packets sent
+within one second. Runs fully offline on loopback addresses (Linux).
+
+    python benchmarks/bench_schedule.py --units 100 --interval 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi import transport  # noqa: E402
+from custom_components.zhimi.airconditioning import AirCondition  # noqa: E402
+from custom_components.zhimi.metrics import PacketRate  # noqa: E402
+from custom_components.zhimi.schedule import (  # noqa: E402
+    next_poll_delay,
+    poll_phase,
+)
+from simulator import start_fleet, stop_fleet  # noqa: E402
+
+
+async def poll_fleet(devices, phases, interval, duration):
+    """Poll every device at its phase until duration has passed."""
+    loop = asyncio.get_event_loop()
+    end = loop.time() + duration
+    polls = 0
+
+    async def poll_device(device, phase):
+        nonlocal polls
+        while True:
+            delay = next_poll_delay(time.time(), phase, interval)
+            if loop.time() + delay > end:
+                return
+            await asyncio.sleep(delay)
+            await device.async_status()
+            polls += 1
+
+    await asyncio.gather(*(poll_device(device, phase)
+                           for device, phase in zip(devices, phases)))
+    return polls
+
+
+async def run(args):
+    fleet = await start_fleet(args.units, args.latency, max_props=args.max_props)
+    devices = [AirCondition(host, token) for host, token, _, _ in fleet]
+    unique_ids = ["28:6c:07:%02x:%02x:%02x" % tuple((unit.device_id & 0xffffff).to_bytes(3, "big"))
+                  for _, _, unit, _ in fleet]
+    try:
+        for device in devices:
+            await device.async_status()  # handshake and batch probe
+
+        for label, phases in (
+                ('aligned', [0.0] * len(devices)),
+                ('spread', [poll_phase(unique_id, args.interval)
+                            for unique_id in unique_ids])):
+            transport.PACKET_RATE = PacketRate()
+            received = sum(unit.requests + unit.handshakes for _, _, unit, _ in fleet)
+            duration = args.intervals * args.interval
+            polls = await poll_fleet(devices, phases, args.interval, duration)
+            received = sum(unit.requests + unit.handshakes
+                           for _, _, unit, _ in fleet) - received
+            print("%-8s %4d units  %5d polls  peak %5d packets/s  "
+                  "average %6.1f packets/s" % (
+                      label, len(devices), polls, transport.PACKET_RATE.peak,
+                      received / duration))
+    finally:
+        for device in devices:
+            device.close()
+        await stop_fleet(fleet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, default=100)
+    parser.add_argument('--interval', type=float, default=10)
+    parser.add_argument('--intervals', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--max-props', type=int, default=3,
+                        help="properties per request, 3 makes 5 requests per poll")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark round trips and wall time of AirCondition.status()
+
+Compares the legacy one property per get_prop request with the probed
+batch size, with and without the tiered property cache. The device is
+emulated in-process: every get_prop costs one round trip of --rtt seconds
+and at most --max-props values are answered.
+
+    python benchmarks/bench_status.py --rtt 0.05 --max-props 15
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirCondition,
+    PROPERTY_TIERS,
+)
+
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+
+PROPERTIES = {
+    'power': 'on',
+    'mode': 'cooling',
+    'st_temp_dec': 260,
+    'temp_dec': 274,
+    'vertical_swing': 'on',
+    'vertical_end': 60,
+    'vertical_rt': 19,
+    'speed_level': 5,
+    'lcd_auto': 'off',
+    'lcd_level': 1,
+    'volume': 'off',
+    'silent': 'off',
+    'comfort': 'off',
+    'idle_timer': 0,
+    'open_timer': 0,
+}
+
+
+class FakeAirCondition(AirCondition):
+    """AirCondition answering get_prop from memory after a fixed delay."""
+
+    def __init__(self, rtt, max_props, refresh_tiers=NO_CACHE):
+        super().__init__('127.0.0.1', '0' * 32, refresh_tiers=refresh_tiers)
+        self.rtt = rtt
+        self.max_props = max_props
+        self.round_trips = 0
+
+    def send(self, command, parameters=None, retry_count=3):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+        return [PROPERTIES[prop] for prop in parameters[:self.max_props]]
+
+
+def run(device, polls):
+    device.round_trips = 0
+    start = time.perf_counter()
+    for _ in range(polls):
+        device.status()
+    elapsed = time.perf_counter() - start
+    return device.round_trips / polls, elapsed / polls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rtt', type=float, default=0.02)
+    parser.add_argument('--max-props', type=int, default=len(PROPERTIES))
+    parser.add_argument('--polls', type=int, default=10)
+    args = parser.parse_args()
+
+    legacy = FakeAirCondition(args.rtt, args.max_props)
+    legacy._batch_size = 1
+    batched = FakeAirCondition(args.rtt, args.max_props)
+    batched.status()  # probe once, as the first poll after startup does
+    cached = FakeAirCondition(args.rtt, args.max_props, refresh_tiers=None)
+    cached.status()
+
+    for name, device in (('legacy', legacy), ('batched', batched),
+                         ('cached', cached)):
+        round_trips, wall = run(device, args.polls)
+        print("%-8s batch=%-3s round trips/status=%5.1f  wall/status=%7.1f ms" % (
+            name, device._batch_size, round_trips, wall * 1000))
+
+
+if __name__ == '__main__':
+    main()
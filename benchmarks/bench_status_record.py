@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of AirConditionStatus construction, access and memory
+
+Compares the slotted, eagerly decoded status with the previous
+implementation wrapping a defaultdict and decoding on every access.
+
+    python benchmarks/bench_status_record.py --count 10000
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirConditionStatus,
+    FanSpeed,
+    LcdBrightness,
+    SwingMode,
+)
+from bench_status import PROPERTIES  # noqa: E402
+
+
+class LegacyAirConditionStatus:
+    """The defaultdict based status, decoding on every property access."""
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def target_temp(self):
+        return self.data['st_temp_dec'] / 10
+
+    @property
+    def temperature(self):
+        return self.data['temp_dec'] / 10
+
+    @property
+    def swing_setting(self):
+        if self.data['vertical_swing'] == 'off':
+            return 0
+        return self.data['vertical_end']
+
+    @property
+    def fan_speed(self):
+        return self.data['speed_level']
+
+    @property
+    def lcd_setting(self):
+        if self.data['lcd_auto'] == 'on':
+            return 6
+        return self.data['lcd_level']
+
+
+def legacy_access(status):
+    return (status.target_temp, status.temperature,
+            FanSpeed(status.fan_speed).name,
+            SwingMode(status.swing_setting).name,
+            LcdBrightness(status.lcd_setting).name)
+
+
+def slotted_access(status):
+    return (status.target_temp, status.temperature,
+            status.fan_mode.name, status.swing_mode.name,
+            status.lcd_brightness.name)
+
+
+def memory_per_instance(factory, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    statuses = [factory() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del statuses
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    legacy_factory = lambda: LegacyAirConditionStatus(  # noqa: E731
+        defaultdict(lambda: None, PROPERTIES))
+    slotted_factory = lambda: AirConditionStatus(dict(PROPERTIES))  # noqa: E731
+    legacy, slotted = legacy_factory(), slotted_factory()
+
+    for name, factory, status, access in (
+            ('legacy', legacy_factory, legacy, legacy_access),
+            ('slotted', slotted_factory, slotted, slotted_access)):
+        construct = timeit.timeit(factory, number=args.count) / args.count
+        read = timeit.timeit(lambda: access(status), number=args.count) / args.count
+        memory = memory_per_instance(factory, args.count)
+        print("%-8s construct=%6.2f us  access=%6.2f us  memory=%6.0f B/status" % (
+            name, construct * 1e6, read * 1e6, memory))
+
+    other = AirConditionStatus(dict(PROPERTIES, temp_dec=251))
+    diff = timeit.timeit(lambda: slotted.diff(other), number=args.count) / args.count
+    print("diff     %6.2f us -> %s" % (diff * 1e6, slotted.diff(other)))
+
+
+if __name__ == '__main__':
+    main()
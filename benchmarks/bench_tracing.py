@@ -0,0 +1,95 @@
+"""
+Benchmark of the tracing overhead and per-phase breakdown of a poll
+
+Polls one simulated unit with tracing disabled and enabled, reports the
+cost of a disabled span, the poll latency in both modes and the average
+time per phase from the written trace file. Runs fully offline on the local
+simulator.
+
+    python benchmarks/bench_tracing.py --polls 500 --max-props 3
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    AirCondition,
+    PROPERTY_TIERS,
+)
+from custom_components.zhimi.tracing import TRACER  # noqa: E402
+from bench_network import percentile  # noqa: E402
+from simulator import start_fleet, stop_fleet  # noqa: E402
+
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+
+
+async def poll(device, polls):
+    latencies = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        with TRACER.span('poll', host=device.ip):
+            await device.async_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def breakdown(path):
+    """Average milliseconds per poll of every span name in the trace."""
+    totals = collections.Counter()
+    with open(path) as trace_file:
+        spans = [json.loads(line) for line in trace_file]
+    polls = sum(1 for span in spans if span['name'] == 'poll')
+    for span in spans:
+        totals[span['name']] += span['ms']
+    return {name: total / polls for name, total in totals.items()}
+
+
+async def run(args):
+    fleet = await start_fleet(1, args.latency, max_props=args.max_props)
+    host, token, _, _ = fleet[0]
+    device = AirCondition(host, token, refresh_tiers=NO_CACHE, command_window=0)
+    path = os.path.join(tempfile.mkdtemp(), 'zhimi_trace.jsonl')
+    try:
+        await device.async_status()  # batch probe
+        noop = min(timeit.repeat(
+            "with TRACER.span('send', host='x', method='get_prop'): pass",
+            globals={'TRACER': TRACER}, number=100000, repeat=5)) / 100000
+        print("disabled span: %.0f ns" % (noop * 1e9))
+
+        for label in ('disabled', 'enabled', 'disabled'):
+            if label == 'enabled':
+                TRACER.start(path)
+                device._transport.session.invalidate()  # trace a handshake
+            latencies = await poll(device, args.polls)
+            TRACER.stop()
+            print("tracing %-8s  poll p50=%6.3f ms p95=%6.3f ms" % (
+                label, statistics.median(latencies) * 1000,
+                percentile(latencies, 0.95) * 1000))
+
+        for name, ms in sorted(breakdown(path).items(), key=lambda item: -item[1]):
+            print("  %-12s %7.3f ms per poll" % (name, ms))
+    finally:
+        device.close()
+        await stop_fleet(fleet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--polls', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--max-props', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
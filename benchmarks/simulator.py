@@ -0,0 +1,249 @@
+"""
+Local miIO simulator of zhimi.aircondition.ma1 units
+
+Every unit answers the miIO handshake, get_prop, miIO.info and all set_*
+commands AirCondition uses, on its own loopback address (127.0.0.2,
+127.0.0.3, ...) and the miIO port. Latency, jitter and packet loss are
+configurable. Hello broadcasts are answered by all units through
+start_broadcast_responder(). Binding to 127.0.0.x other than 127.0.0.1
+requires Linux.
+
+    python benchmarks/simulator.py --units 10 --latency 0.02 --loss 0.01
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from miio.protocol import Message  # noqa: E402
+
+from custom_components.zhimi.airconditioning import (  # noqa: E402
+    COMMAND_PROPERTIES,
+    ZHIMI_AC_MA1,
+)
+from custom_components.zhimi.transport import HEADER, MIIO_PORT  # noqa: E402
+
+_LOGGER = logging.getLogger(__name__)
+
+INITIAL_PROPERTIES = {
+    'mode': 'cooling',
+    'lcd_auto': 'off',
+    'lcd_level': 1,
+    'volume': 'off',
+    'idle_timer': 0,
+    'open_timer': 0,
+    'power': 'on',
+    'temp_dec': 244,
+    'st_temp_dec': 260,
+    'speed_level': 5,
+    'vertical_swing': 'on',
+    'vertical_end': 60,
+    'vertical_rt': 19,
+    'silent': 'off',
+    'comfort': 'off',
+    'ptc': 'off',
+    'ptc_rt': 'off',
+    'ot_run_temp': 7,
+    'ep_temp': 27,
+    'es_temp': 13,
+    'he_temp': 39,
+    'compressor_frq': 0,
+    'motor_speed': 1000,
+    'humidity': None,
+    'ele_quantity': None,
+    'ex_humidity': None,
+    'ot_humidity': None,
+    'remote_mac': None,
+    'htsensor_mac': None,
+    'ht_sensor': None,
+}
+
+
+class SimulatedAirCondition(asyncio.DatagramProtocol):
+    """A zhimi.aircondition.ma1 answering miIO requests."""
+
+    def __init__(self, device_id: int, token: str, latency: float = 0,
+                 jitter: float = 0, loss: float = 0,
+                 max_props: int = None) -> None:
+        self.device_id = device_id
+        self.token = bytes.fromhex(token)
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.max_props = max_props
+        self.properties = dict(INITIAL_PROPERTIES)
+        self.requests = 0
+        self.handshakes = 0
+        self._boot = time.time() - random.randint(1000, 100000)
+        self._transport = None
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+    def _stamp(self) -> int:
+        return int(time.time() - self._boot)
+
+    def datagram_received(self, data, addr) -> None:
+        if self.loss and random.random() < self.loss:
+            return
+
+        if len(data) == HEADER.size + 16:
+            self.handshakes += 1
+            reply = HEADER.pack(0x2131, 32, 0, self.device_id,
+                                self._stamp()) + b'\xff' * 16
+        else:
+            try:
+                request = Message.parse(data, token=self.token).data.value
+            except Exception as ex:
+                _LOGGER.debug("Unable to parse request: %s", ex)
+                return
+            self.requests += 1
+            reply = self._build(self.handle(request))
+
+        delay = self.latency
+        if self.jitter:
+            delay = max(0, delay + random.uniform(-self.jitter, self.jitter))
+        if delay:
+            asyncio.get_event_loop().call_later(
+                delay, self._transport.sendto, reply, addr)
+        else:
+            self._transport.sendto(reply, addr)
+
+    def _build(self, payload: dict) -> bytes:
+        header = {
+            "length": 0,
+            "unknown": 0,
+            "device_id": struct.pack(">I", self.device_id),
+            "ts": datetime.datetime.utcfromtimestamp(self._stamp()),
+        }
+        return Message.build(
+            {"data": {"value": payload},
+             "header": {"value": header},
+             "checksum": 0},
+            token=self.token)
+
+    def handle(self, request: dict) -> dict:
+        """Execute a request and return the reply payload."""
+        method = request.get("method")
+        params = request.get("params") or []
+        reply = {"id": request["id"]}
+
+        if method == "get_prop":
+            props = params[:self.max_props] if self.max_props else params
+            reply["result"] = [self.properties.get(prop) for prop in props]
+        elif method == "miIO.info":
+            reply["result"] = {
+                "model": ZHIMI_AC_MA1,
+                "mac": "28:6C:07:%02X:%02X:%02X" % tuple(
+                    (self.device_id & 0xffffff).to_bytes(3, "big")),
+                "fw_ver": "2.0.9",
+                "hw_ver": "esp32",
+                "mcu_fw_ver": "0010",
+                "token": self.token.hex(),
+                "ap": {"ssid": "simulator", "bssid": "00:00:00:00:00:00",
+                       "rssi": -40},
+                "netif": {"localIp": "127.0.0.1", "mask": "255.0.0.0",
+                          "gw": "127.0.0.1"},
+            }
+        elif method in COMMAND_PROPERTIES:
+            self.properties.update(COMMAND_PROPERTIES[method](params))
+            if method == "set_comfort" and params[0] == "on":
+                self.properties.update(
+                    {"mode": "cooling", "st_temp_dec": 240,
+                     "speed_level": 5, "silent": "off"})
+            elif method == "set_silent" and params[0] == "on":
+                self.properties["comfort"] = "off"
+            reply["result"] = ["ok"]
+        else:
+            reply["error"] = {"code": -9999, "message": "unknown method"}
+        return reply
+
+
+def unit_address(index: int) -> str:
+    """Loopback address of the simulated unit with the given index."""
+    subnet, host = divmod(index, 250)
+    return "127.0.%d.%d" % (subnet, host + 2)
+
+
+async def start_fleet(units: int, latency: float = 0, jitter: float = 0,
+                      loss: float = 0, max_props: int = None) -> list:
+    """Start simulated units, return (host, token, unit, transport) tuples."""
+    loop = asyncio.get_event_loop()
+    fleet = []
+    for index in range(units):
+        host = unit_address(index)
+        token = os.urandom(16).hex()
+        unit = SimulatedAirCondition(
+            0x0f000000 + index, token, latency, jitter, loss, max_props)
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda unit=unit: unit, local_addr=(host, MIIO_PORT))
+        fleet.append((host, token, unit, transport))
+    return fleet
+
+
+class BroadcastResponder(asyncio.DatagramProtocol):
+    """Hand a hello sent to the loopback broadcast address to every unit.
+
+    Sockets bound to a single loopback address never see broadcasts, so the
+    responder listens on its own port and every unit answers from its own
+    address as it would on a LAN.
+    """
+
+    def __init__(self, fleet: list) -> None:
+        self.units = [unit for _, _, unit, _ in fleet]
+
+    def datagram_received(self, data, addr) -> None:
+        if len(data) != HEADER.size + 16:
+            return
+        for unit in self.units:
+            unit.datagram_received(data, addr)
+
+
+async def start_broadcast_responder(fleet: list, port: int):
+    """Answer hello broadcasts to 127.255.255.255:port for the fleet."""
+    loop = asyncio.get_event_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: BroadcastResponder(fleet), local_addr=('0.0.0.0', port))
+    return transport
+
+
+async def stop_fleet(fleet: list) -> None:
+    for _, _, _, transport in fleet:
+        transport.close()
+    await asyncio.sleep(0)  # let the sockets close
+
+
+async def serve(args) -> None:
+    fleet = await start_fleet(args.units, args.latency, args.jitter,
+                              args.loss, args.max_props)
+    for host, token, _, _ in fleet:
+        print("%s %s" % (host, token))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_fleet(fleet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--units', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--max-props', type=int, default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,152 @@
 import enum
 import logging
+import math
+import time
 from typing import Optional
-from collections import defaultdict
 import click
 
 from miio.click_common import command, format_output, EnumType
 from miio import Device, DeviceException
+from miio.device import DeviceInfo
+from miio.exceptions import DeviceError
+
+from .commands import CommandQueue, DEFAULT_COMMAND_WINDOW
+from .health import CircuitBreaker, HALF_OPEN
+from .metrics import DeviceMetrics
+from .tracing import TRACER
+from .transport import AsyncMiIOTransport, DEFAULT_PIPELINE_WINDOW
 
 _LOGGER = logging.getLogger(__name__)
 
 ZHIMI_AC_MA1 = 'zhimi.aircondition.ma1'
 MODELS_SUPPORTED = [ZHIMI_AC_MA1]
 
+STATUS_PROPERTIES = [
+    'power',
+    'mode',
+    'st_temp_dec',
+    'temp_dec',
+    'vertical_swing',
+    'vertical_end',
+    'vertical_rt',
+    'speed_level',
+    'lcd_auto',
+    'lcd_level',
+    'volume',
+    'silent',
+    'comfort',
+    'idle_timer',
+    'open_timer',
+]
+
+# Compressor and coil sensors, only read by the telemetry channel.
+TELEMETRY_PROPERTIES = [
+    'compressor_frq',
+    'motor_speed',
+    'ot_run_temp',
+    'ep_temp',
+    'es_temp',
+    'he_temp',
+]
+
+# Single property read to probe a device which stopped answering.
+HEALTH_PROBE_PROPERTY = 'power'
+
+# Properties grouped by how often they change. The fast tier moves every
+# minute, the slow tier practically only changes when we change it.
+PROPERTY_TIERS = {
+    'fast': ['temp_dec', 'vertical_rt'],
+    'normal': ['power', 'mode', 'st_temp_dec', 'vertical_swing',
+               'vertical_end', 'speed_level', 'silent', 'comfort'],
+    'slow': ['lcd_auto', 'lcd_level', 'volume', 'idle_timer', 'open_timer'],
+}
+
+# Seconds a cached property stays valid, 0 refreshes it on every poll.
+DEFAULT_REFRESH_TIERS = {
+    'fast': 0,
+    'normal': 120,
+    'slow': 900,
+}
+
+# Cached properties changed by a successful command.
+COMMAND_PROPERTIES = {
+    'set_power': lambda params: {'power': params[0]},
+    'set_mode': lambda params: {'mode': params[0]},
+    'set_temperature': lambda params: {'st_temp_dec': params[0]},
+    'set_spd_level': lambda params: {'speed_level': params[0]},
+    'set_vertical': lambda params: {'vertical_swing': params[0]},
+    'set_ver_range': lambda params: {'vertical_end': params[1]},
+    'set_volume_sw': lambda params: {'volume': params[0]},
+    'set_comfort': lambda params: {'comfort': params[0]},
+    'set_silent': lambda params: {'silent': params[0]},
+    'set_lcd': lambda params: {'lcd_level': params[0], 'lcd_auto': 'off'},
+    'set_lcd_auto': lambda params: {'lcd_auto': params[0]},
+    'set_ver_pos': lambda params: {'vertical_rt': params[0]},
+    'set_idle_timer': lambda params: {'idle_timer': params[0]},
+    'set_open_timer': lambda params: {'open_timer': params[0]},
+}
+
+# Properties the device changes on its own in reaction to a command.
+COMMAND_SIDE_EFFECTS = {
+    'set_comfort': ['silent', 'st_temp_dec', 'speed_level'],
+    'set_silent': ['comfort'],
+}
+
+# Settings accepted by AirCondition.apply() and the command for a value, in
+# the order they are sent: the mode before the temperature it applies to.
+APPLY_COMMANDS = [
+    ('mode', lambda value: ('set_mode', [value])),
+    ('target_temp', lambda value: ('set_temperature', [value * 10])),
+    ('fan_speed', lambda value: ('set_spd_level', [value])),
+    ('swing', lambda value: ('set_vertical', [value])),
+    ('swing_range', lambda value: ('set_ver_range', [0, value])),
+    ('swing_angle', lambda value: ('set_ver_pos', [value])),
+    ('volume', lambda value: ('set_volume_sw', [value])),
+    ('lcd_level', lambda value: (
+        ('set_lcd_auto', ['on']) if value == 6 else ('set_lcd', [value]))),
+    ('idle_timer', lambda value: ('set_idle_timer', [value * 60])),
+    ('open_timer', lambda value: ('set_open_timer', [value * 60])),
+]
+APPLY_FIELDS = ['power', 'comfort', 'sleep'] + [field for field, _ in APPLY_COMMANDS]
+# The comfort preset sets these itself (cooling, 24 degrees, auto speed).
+COMFORT_SETTINGS = ('mode', 'target_temp', 'fan_speed')
+# Commands the following commands depend on, never pipelined.
+ORDERED_COMMANDS = ('set_power', 'set_mode', 'set_comfort', 'set_silent')
+
 class AirConditionException(DeviceException):
     pass
 
 
+def validate_state(desired: dict) -> None:
+    """Raise AirConditionException if a desired state cannot be applied."""
+    unknown = set(desired) - set(APPLY_FIELDS)
+    if unknown:
+        raise AirConditionException(
+            "Unknown settings: %s" % ", ".join(sorted(unknown)))
+    fan_speed = desired.get('fan_speed')
+    if fan_speed is not None and (fan_speed < 0 or fan_speed > 5):
+        raise AirConditionException("Invalid wind level: %s" % fan_speed)
+    if desired.get('comfort') == 'on':
+        if desired.get('sleep') == 'on':
+            raise AirConditionException(
+                "The comfort and sleep presets are mutually exclusive")
+        overridden = [field for field in COMFORT_SETTINGS if field in desired]
+        if overridden:
+            raise AirConditionException(
+                "The comfort preset sets %s itself" % ", ".join(overridden))
+
+
+def _stages(plan: list) -> list:
+    """Split a command plan at the commands which have to be sent alone."""
+    stages = []
+    for method, parameters in plan:
+        if method in ORDERED_COMMANDS or not stages or \
+                stages[-1][-1][0] in ORDERED_COMMANDS:
+            stages.append([])
+        stages[-1].append((method, parameters))
+    return stages
+
+
 class FanSpeed(enum.Enum):
     low = 0
     low_medium = 1
@@ -42,8 +173,38 @@ class LcdBrightness(enum.Enum):
     auto = 6
 
 
+def _enum_or_none(enum_type, value):
+    try:
+        return enum_type(value)
+    except ValueError:
+        return None
+
+
 class AirConditionStatus:
-    """Container for status reports of the Zhimi Air Condition."""
+    """Container for status reports of the Zhimi Air Condition.
+
+    The raw properties are decoded once when the status is created, the
+    fields are plain slots afterwards.
+    """
+
+    __slots__ = (
+        'power',
+        'mode',
+        'target_temp',
+        'temperature',
+        'swing_setting',
+        'swing_angle',
+        'fan_speed',
+        'lcd_setting',
+        'volume',
+        'sleep',
+        'comfort',
+        'idle_timer',
+        'open_timer',
+        'fan_mode',
+        'swing_mode',
+        'lcd_brightness',
+    )
 
     def __init__(self, data):
         """
@@ -80,83 +241,51 @@ class AirConditionStatus:
          'ht_sensor': null,}
         """
 
-        self.data = data
-        _LOGGER.debug("BBB self.data: (%s)", self.data)
+        get = data.get
+        self.power = get('power')  # type: Optional[str]
+        self.mode = get('mode')  # type: Optional[str]
 
-    @property
-    def power(self) -> bool:
-        """Current power state."""
-        return self.data['power']
+        st_temp_dec = get('st_temp_dec')
+        temp_dec = get('temp_dec')
+        self.target_temp = st_temp_dec / 10 if st_temp_dec is not None else None
+        self.temperature = temp_dec / 10 if temp_dec is not None else None
 
-    @property
-    def mode(self) -> str:
-        """Current operation mode."""
-        try:
-            return self.data['mode']
-        except TypeError:
-            return None
-
-    @property
-    def target_temp(self) -> float:
-        """Target temperature."""
-        return self.data['st_temp_dec'] / 10
-
-    @property
-    def temperature(self) -> float:
-        """Current temperature."""
-        return self.data['temp_dec'] / 10
-
-    @property
-    def swing_setting(self) -> int:
-        """Vertical swing setting."""
-        if self.data['vertical_swing'] == 'off':
-            return 0
+        if get('vertical_swing') == 'off':
+            self.swing_setting = 0
         else:
-            return self.data['vertical_end']
-
-    @property
-    def swing_angle(self) -> int:
-        """swing vertical angle."""
-        return self.data['swing_angle']
+            self.swing_setting = get('vertical_end')  # type: Optional[int]
+        self.swing_angle = get('vertical_rt')  # type: Optional[int]
+        self.fan_speed = get('speed_level')  # type: Optional[int]
 
-    @property
-    def fan_speed(self) -> int:
-        """Fan speed."""
-        return self.data['speed_level']
-
-    @property
-    def lcd_setting(self) -> int:
-        """LCD level."""
-        if self.data['lcd_auto'] == 'on':
-            return 6
+        if get('lcd_auto') == 'on':
+            self.lcd_setting = 6
         else:
-            return self.data['lcd_level']
-
-    @property
-    def volume(self) -> bool:
-        """Volume."""
-        return self.data['volume']
-
-    @property
-    def sleep(self) -> bool:
-        """silent."""
-        return self.data['silent']
-
-    @property
-    def comfort(self) -> bool:
-        """Comfort."""
-        return self.data['comfort']
-
-    @property
-    def idle_timer(self) -> int:
-        """idle timer."""
-        return self.data['idle_timer']
+            self.lcd_setting = get('lcd_level')  # type: Optional[int]
+
+        self.volume = get('volume')  # type: Optional[str]
+        self.sleep = get('silent')  # type: Optional[str]
+        self.comfort = get('comfort')  # type: Optional[str]
+        self.idle_timer = get('idle_timer')  # type: Optional[int]
+        self.open_timer = get('open_timer')  # type: Optional[int]
+
+        self.fan_mode = _enum_or_none(FanSpeed, self.fan_speed)
+        self.swing_mode = _enum_or_none(SwingMode, self.swing_setting)
+        self.lcd_brightness = _enum_or_none(LcdBrightness, self.lcd_setting)
+
+    def diff(self, other: Optional['AirConditionStatus']) -> dict:
+        """Return the fields whose value differs from other, with our value."""
+        if other is None:
+            return {field: getattr(self, field) for field in self.__slots__}
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) != getattr(other, field)
+        }
 
     @property
-    def open_timer(self) -> int:
-        """open timer."""
-        return self.data['open_timer']
-
+    def data(self) -> dict:
+        """Decoded fields of the status."""
+        return {field: getattr(self, field) for field in self.__slots__}
 
     def __repr__(self) -> str:
         s = "<AirConditionStatus " \
@@ -189,13 +318,19 @@ class AirConditionStatus:
         return s
 
     def __json__(self):
-        return self.data
+        return {
+            field: value.name if isinstance(value, enum.Enum) else value
+            for field, value in self.data.items()
+        }
 
 
 class AirCondition(Device):
 
     def __init__(self, ip: str = None, token: str = None, model: str = ZHIMI_AC_MA1,
-                 start_id: int = 0, debug: int = 0, lazy_discover: bool = True) -> None:
+                 start_id: int = 0, debug: int = 0, lazy_discover: bool = True,
+                 refresh_tiers: dict = None,
+                 command_window: float = DEFAULT_COMMAND_WINDOW,
+                 pipeline_window: int = DEFAULT_PIPELINE_WINDOW) -> None:
         super().__init__(ip, token, start_id, debug, lazy_discover)
 
         if model in MODELS_SUPPORTED:
@@ -203,44 +338,364 @@ class AirCondition(Device):
         else:
             _LOGGER.error("Device model %s unsupported. Falling back to %s.", model, ZHIMI_AC_MA1)
 
-    @command(
-        default_output = format_output(
-            "",
-            "Power: {result.power}\n"
-            "Temperature: {result.temperature} °C\n"
-            "Target temperature: {result.target_temperature} °C\n"
-            "Mode: {result.mode}\n")
-    )
-    def status(self) -> AirConditionStatus:
-        """Retrieve properties."""
-
-        properties = [
-            'power',
-            'mode',
-            'st_temp_dec',
-            'temp_dec',
-            'vertical_swing',
-            'vertical_end',
-            'vertical_rt',
-            'speed_level',
-            'lcd_auto',
-            'lcd_level',
-            'volume',
-            'silent',
-            'comfort',
-            'idle_timer',
-            'open_timer',
-        ]
-
-        # A single request is limited to 1 properties. Therefore the
-        # properties are divided into multiple requests
+        # Largest number of properties the firmware answers in a single
+        # get_prop request. None until probed by the first status().
+        self._batch_size = None
+        self.metrics = DeviceMetrics()
+        self.health = CircuitBreaker(ip)
+        self._transport = AsyncMiIOTransport(
+            ip, token, start_id, metrics=self.metrics)
+        self._pipeline_window = pipeline_window
+
+        tiers = dict(DEFAULT_REFRESH_TIERS, **(refresh_tiers or {}))
+        self._ttl = {
+            prop: tiers[tier]
+            for tier, props in PROPERTY_TIERS.items()
+            for prop in props
+        }
+        self._cache = {}
+        self._fetched_at = {}
+        self._unverified = set()
+        self._queue = CommandQueue(self._async_send_if_changed, command_window)
+        self.commands_suppressed = 0
+        self._stats_since = time.monotonic()
+        self.requests_saved = 0
+
+    def _property_requests(self, properties: list):
+        """Plan the get_prop requests needed to read properties.
+
+        Generator yielding the chunk of properties for the next request.
+        The reply (or the DeviceError raised for it) has to be sent back in,
+        the values of all properties are returned when it is exhausted.
+
+        The first poll probes with all properties in one request. Whenever
+        the reply count does not match, the chunk is requested again with a
+        smaller batch size, which is remembered for the following polls.
+        """
         _props = properties.copy()
         values = []
         while _props:
-            values.extend(self.send("get_prop", _props[:1]))
-            _LOGGER.debug("AAA propertie: (%s), value: (%s)", _props[:1], values)
-            _props[:] = _props[1:]
+            batch_size = self._batch_size or len(_props)
+            chunk = _props[:batch_size]
+            result = yield chunk
+            if isinstance(result, DeviceError):
+                if len(chunk) == 1:
+                    raise result
+                _LOGGER.debug("get_prop of %s properties rejected: %s", len(chunk), result)
+                result = []
+
+            if len(result) != len(chunk) and len(chunk) > 1:
+                if 0 < len(result) < len(chunk):
+                    self._batch_size = len(result)
+                else:
+                    self._batch_size = len(chunk) // 2
+                _LOGGER.debug(
+                    "Count (%s) of received values does not match the count (%s) "
+                    "of requested properties, using batches of %s.",
+                    len(result), len(chunk), self._batch_size)
+                continue
+
+            if self._batch_size is None:
+                self._batch_size = batch_size
+                _LOGGER.debug("Reading up to %s properties per request.", batch_size)
+
+            values.extend(result)
+            _props[:] = _props[len(chunk):]
+
+        return values
+
+    def get_properties(self, properties: list, retry_count: int = 3) -> list:
+        """Read properties using as few get_prop requests as possible."""
+        requests = self._property_requests(properties)
+        try:
+            chunk = next(requests)
+            while True:
+                try:
+                    result = self.send("get_prop", chunk, retry_count)
+                except DeviceError as ex:
+                    result = ex
+                chunk = requests.send(result)
+        except StopIteration as done:
+            return done.value
+
+    async def async_get_properties(self, properties: list,
+                                   retry_count: int = 3) -> list:
+        """Read properties without blocking the event loop.
+
+        Once the batch size is known, the get_prop requests of a status
+        needing several are pipelined. They are read again one after the
+        other only if the device rejects a request or answers with another
+        count of values, a device which does not answer fails the read.
+        """
+        batch_size = self._batch_size
+        if self._pipeline_window > 1 and batch_size and len(properties) > batch_size:
+            chunks = [properties[index:index + batch_size]
+                      for index in range(0, len(properties), batch_size)]
+            results = await self.async_send_many(
+                [("get_prop", chunk) for chunk in chunks], retry_count)
+            for result in results:
+                if (isinstance(result, DeviceException)
+                        and not isinstance(result, DeviceError)):
+                    raise result
+            if all(isinstance(result, list) and len(result) == len(chunk)
+                   for chunk, result in zip(chunks, results)):
+                return [value for result in results for value in result]
+            _LOGGER.debug("Pipelined get_prop failed, reading serially: %s", results)
+
+        requests = self._property_requests(properties)
+        try:
+            chunk = next(requests)
+            while True:
+                try:
+                    result = await self.async_send("get_prop", chunk, retry_count)
+                except DeviceError as ex:
+                    result = ex
+                chunk = requests.send(result)
+        except StopIteration as done:
+            return done.value
+
+    def send(self, command: str, parameters=None, retry_count: int = 3):
+        """Send a command and write its outcome through to the cache."""
+        with TRACER.span('send', host=self.ip, method=command):
+            self.health.check()
+            start = time.monotonic()
+            try:
+                result = super().send(command, parameters, retry_count)
+            except DeviceError:
+                self.metrics.errors[command] += 1
+                raise
+            except DeviceException:
+                self.metrics.errors[command] += 1
+                self.health.record_failure()
+                raise
+            self.metrics.observe_request(command, time.monotonic() - start)
+            self.health.record_success()
+            self._command_sent(command, parameters, result)
+            return result
+
+    async def async_send(self, command: str, parameters=None, retry_count: int = 3):
+        """Send a command through the asyncio transport."""
+        with TRACER.span('send', host=self.ip, method=command):
+            self.health.check()
+            start = time.monotonic()
+            try:
+                result = await self._transport.send(command, parameters, retry_count)
+            except DeviceError:
+                self.metrics.errors[command] += 1
+                raise
+            except DeviceException:
+                self.metrics.errors[command] += 1
+                self.health.record_failure()
+                raise
+            self.metrics.observe_request(command, time.monotonic() - start)
+            self.health.record_success()
+            self._command_sent(command, parameters, result)
+            return result
+
+    async def async_send_many(self, requests: list, retry_count: int = 3) -> list:
+        """Send (command, parameters) requests pipelined.
+
+        Returns the results in order, with the DeviceException in place of
+        the result of a failed request.
+        """
+        with TRACER.span('send_many', host=self.ip, requests=len(requests)):
+            self.health.check()
+            results = await self._transport.send_many(
+                requests, self._pipeline_window, retry_count)
+
+            unreachable = False
+            for (method, parameters), result in zip(requests, results):
+                if isinstance(result, DeviceException):
+                    self.metrics.errors[method] += 1
+                    unreachable |= not isinstance(result, DeviceError)
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    self._command_sent(method, parameters, result)
+            if unreachable:
+                self.health.record_failure()
+            else:
+                self.health.record_success()
+            return results
+
+    def _command_sent(self, command: str, parameters, result) -> None:
+        """Update the cached status after a successful set_* command.
+
+        The properties touched are remembered, async_verify() reads them
+        back from the device instead of polling the full status again.
+        """
+        if command not in COMMAND_PROPERTIES or result != ['ok']:
+            return
+
+        changes = COMMAND_PROPERTIES[command](parameters)
+        now = time.monotonic()
+        for prop, value in changes.items():
+            self._cache[prop] = value
+            self._fetched_at[prop] = now
+        self._unverified.update(changes)
+        self._unverified.update(COMMAND_SIDE_EFFECTS.get(command, []))
+
+    def _is_current(self, command: str, parameters, any_age: bool = False) -> bool:
+        """Return True if the command would not change the fresh cached state.
+
+        With any_age the cached values are trusted regardless of their age.
+        """
+        if command not in COMMAND_PROPERTIES:
+            return False
+
+        now = time.monotonic()
+        for prop, value in COMMAND_PROPERTIES[command](parameters).items():
+            if prop not in self._fetched_at:
+                return False
+            if not any_age and now - self._fetched_at[prop] >= max(self._ttl[prop], 1):
+                return False
+            cached = self._cache[prop]
+            if isinstance(value, (int, float)) and isinstance(cached, (int, float)):
+                if abs(value - cached) > 1e-6:
+                    return False
+            elif value != cached:
+                return False
+        return True
+
+    async def _async_send_if_changed(self, command: str, parameters):
+        if self._is_current(command, parameters):
+            self.commands_suppressed += 1
+            _LOGGER.debug("Suppressing %s %s, the device is already set",
+                          command, parameters)
+            return ['ok']
+        return await self.async_send(command, parameters)
+
+    async def async_command(self, command: str, parameters):
+        """Send a set_* command through the coalescing command queue.
+
+        The last value queued within the window is sent, or dropped when it
+        would not change the cached state at that time.
+        """
+        return await self._queue.put(command, parameters)
+
+    def plan_state(self, desired: dict) -> list:
+        """Return the (command, parameters) needed to reach a desired state.
+
+        desired is a partial state with keys of APPLY_FIELDS, values already
+        matching the last known status are skipped. Powering on comes first,
+        powering off last. A preset is switched off before and switched on
+        after the other settings, the comfort and sleep presets are
+        mutually exclusive, see validate_state().
+        """
+        validate_state(desired)
+
+        first, settings, last = [], [], []
+        if desired.get('power') == 'on':
+            first.append(('set_power', ['on']))
+        for field, method in (('comfort', 'set_comfort'), ('sleep', 'set_silent')):
+            if desired.get(field) == 'off':
+                first.append((method, ['off']))
+            elif desired.get(field) == 'on':
+                last.append((method, ['on']))
+        for field, build in APPLY_COMMANDS:
+            if field in desired:
+                settings.append(build(desired[field]))
+        if desired.get('power') == 'off':
+            last.append(('set_power', ['off']))
+
+        plan = [(method, parameters) for method, parameters in first + settings + last
+                if not self._is_current(method, parameters, any_age=True)]
+        # Switching a preset on switches the other one off on the device.
+        if ('set_comfort', ['on']) in plan and ('set_silent', ['off']) in plan:
+            plan.remove(('set_silent', ['off']))
+        if ('set_silent', ['on']) in plan and ('set_comfort', ['off']) in plan:
+            plan.remove(('set_comfort', ['off']))
+        return plan
+
+    def apply(self, desired: dict) -> list:
+        """Send only the commands needed to reach a desired state.
+
+        Returns the (command, parameters) sent, see plan_state().
+        """
+        plan = self.plan_state(desired)
+        _LOGGER.debug("Applying %s with %s", desired, plan)
+        for method, parameters in plan:
+            result = self.send(method, parameters)
+            if result != ['ok']:
+                raise AirConditionException(
+                    "%s %s failed: %s" % (method, parameters, result))
+        return plan
+
+    async def async_apply(self, desired: dict) -> list:
+        """Send only the commands needed to reach a desired state.
+
+        Commands between the ordering sensitive ones (power, mode, presets)
+        are pipelined.
+        """
+        plan = self.plan_state(desired)
+        _LOGGER.debug("Applying %s with %s", desired, plan)
+        for stage in _stages(plan):
+            if len(stage) == 1 or self._pipeline_window <= 1:
+                results = [await self.async_send(method, parameters)
+                           for method, parameters in stage]
+            else:
+                results = await self.async_send_many(stage)
+            for (method, parameters), result in zip(stage, results):
+                if isinstance(result, Exception):
+                    raise result
+                if result != ['ok']:
+                    raise AirConditionException(
+                        "%s %s failed: %s" % (method, parameters, result))
+        return plan
 
+    @property
+    def handshakes_per_hour(self) -> float:
+        """Average miIO handshakes per hour with this device."""
+        return self._transport.session.handshakes_per_hour
+
+    @property
+    def commands_coalesced(self) -> int:
+        """Number of commands replaced by a later one of the same kind."""
+        return self._queue.coalesced
+
+    async def async_telemetry(self) -> dict:
+        """Read the compressor and coil sensors."""
+        values = await self.async_get_properties(TELEMETRY_PROPERTIES)
+        return dict(zip(TELEMETRY_PROPERTIES, values))
+
+    def expire_unverified(self) -> None:
+        """Let the next status poll read back the properties changed by commands.
+
+        The written through values stay cached, and plan_state() still
+        trusts them.
+        """
+        for prop in self._unverified:
+            if prop in self._fetched_at:
+                self._fetched_at[prop] = -math.inf
+
+    async def async_verify(self) -> AirConditionStatus:
+        """Read back the properties changed by the last commands."""
+        properties = [prop for prop in STATUS_PROPERTIES
+                      if prop in self._unverified]
+        self._unverified.clear()
+        values = await self.async_get_properties(properties)
+        return self._build_status(properties, values)
+
+    async def async_info(self, retry_count: int = 3) -> DeviceInfo:
+        """Get miIO protocol information from the device."""
+        return DeviceInfo(await self.async_send(
+            "miIO.info", retry_count=retry_count))
+
+    def close(self) -> None:
+        """Release the socket of the asyncio transport."""
+        self._transport.close()
+
+    def _expired_properties(self) -> list:
+        """Return the status properties whose cached value is too old."""
+        now = time.monotonic()
+        return [
+            prop for prop in STATUS_PROPERTIES
+            if prop not in self._fetched_at
+            or now - self._fetched_at[prop] >= self._ttl[prop]
+        ]
+
+    def _build_status(self, properties: list, values: list) -> AirConditionStatus:
+        """Merge freshly read values into the cache and return the status."""
         properties_count = len(properties)
         values_count = len(values)
         if properties_count != values_count:
@@ -249,8 +704,68 @@ class AirCondition(Device):
                 "count (%s) of received values.",
                 properties_count, values_count)
 
-        return AirConditionStatus(
-            defaultdict(lambda: None, zip(properties, values)))
+        now = time.monotonic()
+        for prop, value in zip(properties, values):
+            self._cache[prop] = value
+            self._fetched_at[prop] = now
+
+        return self.cached_status
+
+    def _count_saved_requests(self, properties: list) -> None:
+        """Count the get_prop requests a status poll of properties saved."""
+        batch_size = self._batch_size or 1
+        self.requests_saved += (
+            math.ceil(len(STATUS_PROPERTIES) / batch_size)
+            - math.ceil(len(properties) / batch_size))
+
+    @property
+    def cached_status(self) -> Optional[AirConditionStatus]:
+        """Last known status including the effect of sent commands."""
+        if not self._cache:
+            return None
+        return AirConditionStatus(self._cache)
+
+    @property
+    def requests_saved_per_hour(self) -> float:
+        """Average get_prop requests per hour avoided by the property cache."""
+        hours = (time.monotonic() - self._stats_since) / 3600
+        return round(self.requests_saved / hours, 1) if hours > 0 else 0.0
+
+    @command(
+        default_output = format_output(
+            "",
+            "Power: {result.power}\n"
+            "Temperature: {result.temperature} °C\n"
+            "Target temperature: {result.target_temperature} °C\n"
+            "Mode: {result.mode}\n")
+    )
+    def status(self) -> AirConditionStatus:
+        """Retrieve properties, cached ones which are still valid are reused."""
+        with TRACER.span('status', host=self.ip):
+            self.health.check()
+            if self.health.state == HALF_OPEN:
+                self.send("get_prop", [HEALTH_PROBE_PROPERTY], 0)
+            properties = self._expired_properties()
+            values = self.get_properties(properties, self.health.retry_count)
+            self._count_saved_requests(properties)
+            return self._build_status(properties, values)
+
+    async def async_status(self) -> AirConditionStatus:
+        """Retrieve properties without blocking the event loop.
+
+        Fails fast with DeviceUnavailable while the circuit of an unreachable
+        device is open. After the backoff a single property is read as a
+        probe before the full status is requested again.
+        """
+        with TRACER.span('status', host=self.ip):
+            self.health.check()
+            if self.health.state == HALF_OPEN:
+                await self.async_send("get_prop", [HEALTH_PROBE_PROPERTY], 0)
+            properties = self._expired_properties()
+            values = await self.async_get_properties(
+                properties, self.health.retry_count)
+            self._count_saved_requests(properties)
+            return self._build_status(properties, values)
 
     @command(
         default_output = format_output("Powering the air condition on"),
@@ -379,4 +894,63 @@ class AirCondition(Device):
         """Set AC open timer."""
         return self.send("set_open_timer", [timer * 60])
 
+    async def async_on(self):
+        """Turn the air condition on."""
+        return await self.async_command("set_power", ["on"])
 
+    async def async_off(self):
+        """Turn the air condition off."""
+        return await self.async_command("set_power", ["off"])
+
+    async def async_set_mode(self, mode: str):
+        """Set operation mode."""
+        return await self.async_command("set_mode", [mode])
+
+    async def async_set_temperature(self, temperature: float):
+        """Set target temperature."""
+        return await self.async_command("set_temperature", [temperature * 10])
+
+    async def async_set_fan_speed(self, fan_speed: int):
+        """Set fan speed."""
+        if fan_speed < 0 or fan_speed > 5:
+            raise AirConditionException("Invalid wind level: %s", fan_speed)
+        return await self.async_command("set_spd_level", [fan_speed])
+
+    async def async_set_swing(self, swing: str):
+        """Set swing on/off."""
+        return await self.async_command("set_vertical", [swing])
+
+    async def async_set_ver_range(self, swing_end: int):
+        """Set vertical swing end."""
+        return await self.async_command("set_ver_range", [0, swing_end])
+
+    async def async_set_volume(self, volume: str):
+        """Set volume on/off."""
+        return await self.async_command("set_volume_sw", [volume])
+
+    async def async_set_comfort(self, comfort: str):
+        """Set comfort on/off."""
+        return await self.async_command("set_comfort", [comfort])
+
+    async def async_set_sleep(self, sleep: str):
+        """Set sleep on/off."""
+        return await self.async_command("set_silent", [sleep])
+
+    async def async_set_lcd_level(self, lcd_level: int):
+        """Set lcd level."""
+        if lcd_level == 6:
+            return await self.async_command("set_lcd_auto", ["on"])
+        else:
+            return await self.async_command("set_lcd", [lcd_level])
+
+    async def async_set_swing_angle(self, angle: int):
+        """Set swing vertical angle."""
+        return await self.async_command("set_ver_pos", [angle])
+
+    async def async_set_idle_timer(self, timer: int):
+        """Set AC idle timer."""
+        return await self.async_command("set_idle_timer", [timer * 60])
+
+    async def async_set_open_timer(self, timer: int):
+        """Set AC open timer."""
+        return await self.async_command("set_open_timer", [timer * 60])
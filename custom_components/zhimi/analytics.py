@@ -0,0 +1,165 @@
+"""
+Energy and runtime analytics over the history of a Zhimi Air Condition.
+
+All functions take the decoded column arrays returned by
+DeviceHistory.read() and are vectorized with NumPy, one day of a device is a
+handful of array operations regardless of the number of samples.
+"""
+import numpy as np
+
+# Electrical input power in watts at a compressor frequency in Hz, linearly
+# interpolated. The value at 0 Hz is drawn while on with the compressor idle
+# (fan only). A rough default for a 1.5 HP inverter unit.
+DEFAULT_POWER_CURVE = ((0, 30), (30, 450), (60, 900), (90, 1350))
+DEFAULT_SETPOINT_TOLERANCE = 0.5
+# Samples further apart than this are treated as a gap in the history.
+DEFAULT_MAX_GAP = 300
+
+FREQUENCY_MISSING = -32768
+
+DATA_ANALYTICS = 'climate.zhimi.analytics'
+
+
+def sample_durations(ts: np.ndarray, max_gap: int = DEFAULT_MAX_GAP) -> np.ndarray:
+    """Seconds each sample stands for, until the next sample or max_gap."""
+    if len(ts) == 0:
+        return np.zeros(0)
+    durations = np.diff(ts.astype(np.int64), append=int(ts[-1]))
+    if len(durations) > 1:
+        durations[-1] = np.median(durations[:-1])
+    return np.minimum(durations, max_gap).astype(np.float64)
+
+
+def estimate_power(frequency: np.ndarray, power_curve=DEFAULT_POWER_CURVE) -> np.ndarray:
+    """Electrical power in watts at the given compressor frequencies."""
+    curve = np.asarray(power_curve, dtype=np.float64)
+    return np.interp(frequency, curve[:, 0], curve[:, 1])
+
+
+def setpoint_events(power: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Indices of the samples where the unit was started or the target changed."""
+    on = power == 1
+    previous_on = np.r_[False, on[:-1]]
+    previous_target = np.r_[target[:1], target[:-1]]
+    changed = (target != previous_target) & ~np.isnan(target)
+    return np.flatnonzero(on & (~previous_on | changed))
+
+
+def time_to_setpoint(ts, power, temperature, target,
+                     tolerance: float = DEFAULT_SETPOINT_TOLERANCE,
+                     events: np.ndarray = None) -> np.ndarray:
+    """Seconds from each setpoint event until the setpoint is reached.
+
+    Returns one value per event of setpoint_events(), NaN when the setpoint
+    was not reached before the unit was switched off or the next event.
+    """
+    on = power == 1
+    if events is None:
+        events = setpoint_events(power, target)
+    if len(events) == 0:
+        return np.zeros(0)
+
+    reached = np.flatnonzero(on & (np.abs(temperature - target) <= tolerance))
+    # The setpoint must be reached before the next event or switching off.
+    off = np.flatnonzero(~on)
+    boundary = np.minimum(
+        np.r_[events[1:], len(ts)],
+        np.r_[off, len(ts)][np.searchsorted(off, events)])
+
+    position = np.searchsorted(reached, events)
+    found = position < len(reached)
+    first = np.where(found, reached[np.minimum(position, len(reached) - 1)], 0)
+    valid = found & (first < boundary)
+
+    result = np.full(len(events), np.nan)
+    result[valid] = ts[first[valid]].astype(np.int64) - ts[events[valid]].astype(np.int64)
+    return result
+
+
+def daily_stats(columns: dict, power_curve=DEFAULT_POWER_CURVE,
+                tolerance: float = DEFAULT_SETPOINT_TOLERANCE,
+                utc_offset: int = 0, max_gap: int = DEFAULT_MAX_GAP) -> dict:
+    """Aggregate the history of a device per local day.
+
+    Returns arrays indexed by day: day (local midnight as UTC timestamp),
+    runtime_hours, compressor_duty_cycle (fraction of the runtime the
+    compressor ran, NaN without frequency samples), energy_kwh and
+    time_to_setpoint (mean seconds, NaN without reached setpoints).
+    """
+    ts = columns['ts'].astype(np.int64)
+    if len(ts) == 0:
+        return {key: np.zeros(0) for key in (
+            'day', 'runtime_hours', 'compressor_duty_cycle', 'energy_kwh',
+            'time_to_setpoint')}
+
+    days = (ts + utc_offset) // 86400
+    first_day = days[0]
+    index = days - first_day
+    count = int(index[-1]) + 1
+
+    durations = sample_durations(ts, max_gap)
+    on = columns['power'] == 1
+    frequency = columns['compressor_frq'].astype(np.float64)
+    known = on & (columns['compressor_frq'] != FREQUENCY_MISSING)
+    frequency[~known] = 0
+
+    on_seconds = np.bincount(index, np.where(on, durations, 0), count)
+    known_seconds = np.bincount(index, np.where(known, durations, 0), count)
+    running_seconds = np.bincount(
+        index, np.where(known & (frequency > 0), durations, 0), count)
+    joules = np.bincount(
+        index, np.where(on, estimate_power(frequency, power_curve) * durations, 0),
+        count)
+
+    duty = np.full(count, np.nan)
+    np.divide(running_seconds, known_seconds, out=duty, where=known_seconds > 0)
+
+    events = setpoint_events(columns['power'], columns['target'])
+    setpoint = time_to_setpoint(
+        ts, columns['power'], columns['temperature'], columns['target'],
+        tolerance, events)
+    reached = ~np.isnan(setpoint)
+    event_days = index[events][reached]
+    setpoint_sum = np.bincount(event_days, setpoint[reached], count)
+    setpoint_count = np.bincount(event_days, minlength=count)
+    mean_setpoint = np.full(count, np.nan)
+    np.divide(setpoint_sum, setpoint_count, out=mean_setpoint,
+              where=setpoint_count > 0)
+
+    return {
+        'day': (first_day + np.arange(count)) * 86400 - utc_offset,
+        'runtime_hours': on_seconds / 3600,
+        'compressor_duty_cycle': duty,
+        'energy_kwh': joules / 3.6e6,
+        'time_to_setpoint': mean_setpoint,
+    }
+
+
+class DailyAnalytics:
+    """Today's and yesterday's statistics of one device history."""
+
+    FIELDS = ('runtime_hours', 'compressor_duty_cycle', 'energy_kwh',
+              'time_to_setpoint')
+
+    def __init__(self, history, power_curve=DEFAULT_POWER_CURVE,
+                 tolerance: float = DEFAULT_SETPOINT_TOLERANCE) -> None:
+        self.history = history
+        self.power_curve = sorted(tuple(point) for point in power_curve)
+        self.tolerance = tolerance
+
+    def compute(self, now: int, utc_offset: int = 0) -> dict:
+        """Return {'today': {...}, 'yesterday': {...}}, None for unknown values."""
+        today = (now + utc_offset) // 86400 * 86400 - utc_offset
+        stats = daily_stats(
+            self.history.read(today - 86400, now + 1), self.power_curve,
+            self.tolerance, utc_offset)
+        result = {}
+        for key, day in (('today', today), ('yesterday', today - 86400)):
+            match = np.flatnonzero(stats['day'] == day)
+            result[key] = {
+                field: (float(stats[field][match[0]])
+                        if len(match) and not np.isnan(stats[field][match[0]])
+                        else None)
+                for field in self.FIELDS
+            }
+        return result
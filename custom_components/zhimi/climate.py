@@ -4,7 +4,7 @@ Support for Zhimi Air Condition ma1
 import enum
 import logging
 import asyncio
-from functools import partial
+import time
 from datetime import timedelta
 import voluptuous as vol
 from typing import Optional
@@ -13,9 +13,45 @@ import click
 from miio import Device, DeviceException
 from miio.click_common import command, format_output, EnumType
 
-from .airconditioning import AirCondition, LcdBrightness, FanSpeed, SwingMode
+from .airconditioning import (
+    AirCondition,
+    AirConditionException,
+    FanSpeed,
+    SwingMode,
+    PROPERTY_TIERS,
+    validate_state,
+)
+from .commands import DEFAULT_COMMAND_WINDOW
+from .transport import DEFAULT_PIPELINE_WINDOW
+from .telemetry import (
+    TelemetrySampler,
+    CONF_TELEMETRY,
+    CONF_TELEMETRY_INTERVAL,
+    CONF_TELEMETRY_BUFFER_SIZE,
+    DATA_TELEMETRY,
+    DEFAULT_TELEMETRY_INTERVAL,
+    DEFAULT_TELEMETRY_BUFFER_SIZE,
+)
+from .history import DATA_HISTORY, DeviceHistory, HistoryWriter
+from .metrics import DATA_METRICS
+from .tracing import DEFAULT_TRACE_FILE, TRACER
+from .analytics import (
+    DATA_ANALYTICS,
+    DEFAULT_POWER_CURVE,
+    DEFAULT_SETPOINT_TOLERANCE,
+    DailyAnalytics,
+)
+from .coordinator import (
+    ZhimiUpdateCoordinator,
+    DEFAULT_PARALLEL_POLLS,
+    DEFAULT_POLL_TIMEOUT,
+)
+from .schedule import DEFAULT_MAX_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL
+
+from aiohttp import web
 
 from homeassistant.components.climate import ClimateEntity, PLATFORM_SCHEMA
+from homeassistant.components.http import HomeAssistantView
 from homeassistant.components.climate.const import (
     ATTR_HVAC_MODE,
     DOMAIN,
@@ -40,12 +76,19 @@ from homeassistant.const import (
     CONF_HOST,
     CONF_TOKEN,
     CONF_BRIGHTNESS,
+    EVENT_HOMEASSISTANT_STOP,
     TEMP_CELSIUS,
 )
+from homeassistant.core import callback
+from homeassistant.helpers.event import (
+    async_call_later,
+    async_track_time_interval,
+)
+from homeassistant.helpers.storage import Store
 
 from homeassistant.exceptions import PlatformNotReady
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers import config_validation as cv, entity_platform, service
+from homeassistant.helpers import config_validation as cv, discovery
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -53,19 +96,54 @@ SUCCESS = ['ok']
 
 DEFAULT_NAME = 'Zhimi Air Condition'
 DATA_KEY = 'climate.zhimi'
+DATA_COORDINATOR = 'climate.zhimi.coordinator'
+DATA_IDENTITIES = 'climate.zhimi.identities'
+HISTORY_DIR = 'zhimi_history'
+HISTORY_FLUSH_ROWS = 60
+HISTORY_ROLLUP_JOB_INTERVAL = timedelta(days=1)
+SERVICE_DOMAIN = 'zhimi'
+STORAGE_KEY = 'zhimi.devices'
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+SERVICE_PARALLEL_CALLS = 10
 TARGET_TEMPERATURE_STEP = 0.1
+VERIFY_DELAY = 2
 
 CONF_MIN_TEMP = 'min_temp'
 CONF_MAX_TEMP = 'max_temp'
 CONF_ANGLE = 'angle'
 CONF_TIMER = 'timer'
+CONF_PARALLEL_POLLS = 'parallel_polls'
+CONF_POLL_TIMEOUT = 'poll_timeout'
+CONF_REFRESH_TIERS = 'refresh_tiers'
+CONF_COMMAND_WINDOW = 'command_window'
+CONF_PIPELINE_WINDOW = 'pipeline_window'
+CONF_MIN_POLL_INTERVAL = 'min_poll_interval'
+CONF_MAX_POLL_INTERVAL = 'max_poll_interval'
+CONF_HISTORY = 'history'
+CONF_ROLLUP_AFTER = 'rollup_after'
+CONF_ROLLUP_INTERVAL = 'rollup_interval'
+CONF_POWER_CURVE = 'power_curve'
+CONF_SETPOINT_TOLERANCE = 'setpoint_tolerance'
 
 ATTR_AIR_CONDITION_MODEL = "ac_model"
+ATTR_MODEL = "model"
+ATTR_MAC = "mac_address"
+ATTR_FIRMWARE_VERSION = "firmware_version"
+ATTR_HARDWARE_VERSION = "hardware_version"
+ATTR_UNIQUE_ID = "unique_id"
 ATTR_SWING_ANGLE = "swing_angle"
 ATTR_LCD_SETTING = "lcd_setting"
 ATTR_VOLUME = "volume"
 ATTR_IDLE_TIMER = "idle_timer"
 ATTR_OPEN_TIMER = "open_timer"
+ATTR_REQUESTS_SAVED = "requests_saved_per_hour"
+ATTR_COMMANDS_COALESCED = "commands_coalesced"
+ATTR_COMMANDS_SUPPRESSED = "commands_suppressed"
+ATTR_HANDSHAKES = "handshakes_per_hour"
+ATTR_HEALTH = "health"
+ATTR_STATE_WRITES = "state_writes"
+ATTR_STATE_WRITES_SKIPPED = "state_writes_skipped"
 
 SCAN_INTERVAL = timedelta(seconds=60)
 
@@ -81,6 +159,36 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
     vol.Optional(CONF_MIN_TEMP, default=16): vol.Coerce(int),
     vol.Optional(CONF_MAX_TEMP, default=30): vol.Coerce(int),
+    # Shared by the whole fleet, no defaults to tell which entries set them.
+    vol.Optional(CONF_PARALLEL_POLLS): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(CONF_POLL_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=1)),
+    vol.Optional(CONF_REFRESH_TIERS, default={}):
+        vol.Schema({vol.In(list(PROPERTY_TIERS)): cv.positive_int}),
+    vol.Optional(CONF_COMMAND_WINDOW, default=DEFAULT_COMMAND_WINDOW):
+        vol.All(vol.Coerce(float), vol.Range(min=0, max=10)),
+    vol.Optional(CONF_PIPELINE_WINDOW, default=DEFAULT_PIPELINE_WINDOW):
+        vol.All(vol.Coerce(int), vol.Range(min=1, max=16)),
+    vol.Optional(CONF_MIN_POLL_INTERVAL, default=DEFAULT_MIN_POLL_INTERVAL):
+        vol.All(vol.Coerce(float), vol.Range(min=1)),
+    vol.Optional(CONF_MAX_POLL_INTERVAL, default=DEFAULT_MAX_POLL_INTERVAL):
+        vol.All(vol.Coerce(float), vol.Range(min=1)),
+    vol.Optional(CONF_TELEMETRY): vol.Schema({
+        vol.Optional(CONF_TELEMETRY_INTERVAL, default=DEFAULT_TELEMETRY_INTERVAL):
+            vol.All(vol.Coerce(float), vol.Range(min=1)),
+        vol.Optional(CONF_TELEMETRY_BUFFER_SIZE, default=DEFAULT_TELEMETRY_BUFFER_SIZE):
+            vol.All(vol.Coerce(int), vol.Range(min=1)),
+    }),
+    vol.Optional(CONF_HISTORY): vol.Schema({
+        vol.Optional(CONF_ROLLUP_AFTER, default=30):
+            vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(CONF_ROLLUP_INTERVAL, default=300):
+            vol.All(vol.Coerce(int), vol.Range(min=10)),
+        vol.Optional(CONF_POWER_CURVE, default=list(DEFAULT_POWER_CURVE)):
+            vol.All([vol.ExactSequence([vol.Coerce(float), vol.Coerce(float)])],
+                    vol.Length(min=2)),
+        vol.Optional(CONF_SETPOINT_TOLERANCE, default=DEFAULT_SETPOINT_TOLERANCE):
+            vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }),
 })
 
 SERVICE_TURN_ON_AC_VOLUME = "turn_on_ac_volume"
@@ -89,8 +197,20 @@ SERVICE_SET_AC_LCD_LEVEL = "set_ac_lcd_level"
 SERVICE_SET_AC_SWING_ANGLE = "set_ac_swing_angle"
 SERVICE_SET_AC_IDLE_TIMER = "set_ac_idle_timer"
 SERVICE_SET_AC_OPEN_TIMER = "set_ac_open_timer"
-
-SERVICE_SCHEMA = vol.Schema({vol.Optional(ATTR_ENTITY_ID): cv.entity_ids})
+SERVICE_APPLY_STATE = "apply_state"
+SERVICE_SET_TRACING = "set_tracing"
+
+ATTR_POWER = "power"
+ATTR_MODE = "mode"
+ATTR_FAN_SPEED = "fan_speed"
+ATTR_SWING = "swing"
+ATTR_SWING_RANGE = "swing_range"
+ATTR_COMFORT = "comfort"
+ATTR_SLEEP = "sleep"
+ATTR_LCD_LEVEL = "lcd_level"
+ATTR_ENABLED = "enabled"
+
+SERVICE_SCHEMA = vol.Schema({vol.Required(ATTR_ENTITY_ID): cv.entity_ids})
 SERVICE_SCHEMA_LCD_level = SERVICE_SCHEMA.extend(
     {vol.Required(CONF_BRIGHTNESS, default=3): vol.All(int, vol.Range(min=0, max=6))})
 SERVICE_SCHEMA_SWING_ANGLE = SERVICE_SCHEMA.extend(
@@ -98,6 +218,39 @@ SERVICE_SCHEMA_SWING_ANGLE = SERVICE_SCHEMA.extend(
 SERVICE_SCHEMA_TIMER = SERVICE_SCHEMA.extend(
     {vol.Required(CONF_TIMER, default=90): vol.All(int, vol.Range(min=0, max=480))})
 
+ON_OFF = vol.In(['on', 'off'])
+
+
+def _valid_apply_state(data):
+    """Reject combinations of settings apply_state cannot reach."""
+    desired = {key: value for key, value in data.items() if key != ATTR_ENTITY_ID}
+    if ATTR_TEMPERATURE in desired:
+        desired['target_temp'] = desired.pop(ATTR_TEMPERATURE)
+    try:
+        validate_state(desired)
+    except AirConditionException as ex:
+        raise vol.Invalid(str(ex))
+    return data
+
+
+SERVICE_SCHEMA_APPLY_STATE = vol.All(SERVICE_SCHEMA.extend({
+    vol.Optional(ATTR_POWER): ON_OFF,
+    vol.Optional(ATTR_MODE): vol.In(
+        ['automode', 'cooling', 'heat', 'wind', 'arefaction']),
+    vol.Optional(ATTR_TEMPERATURE): vol.All(vol.Coerce(float), vol.Range(min=16, max=32)),
+    vol.Optional(ATTR_FAN_SPEED): vol.All(int, vol.Range(min=0, max=5)),
+    vol.Optional(ATTR_SWING): ON_OFF,
+    vol.Optional(ATTR_SWING_RANGE): vol.In([20, 40, 60]),
+    vol.Optional(ATTR_SWING_ANGLE): vol.All(int, vol.Range(min=0, max=60)),
+    vol.Optional(ATTR_VOLUME): ON_OFF,
+    vol.Optional(ATTR_COMFORT): ON_OFF,
+    vol.Optional(ATTR_SLEEP): ON_OFF,
+    vol.Optional(ATTR_LCD_LEVEL): vol.All(int, vol.Range(min=0, max=6)),
+    vol.Optional(ATTR_IDLE_TIMER): vol.All(int, vol.Range(min=0, max=480)),
+    vol.Optional(ATTR_OPEN_TIMER): vol.All(int, vol.Range(min=0, max=480)),
+}), _valid_apply_state)
+SERVICE_SCHEMA_SET_TRACING = vol.Schema({vol.Required(ATTR_ENABLED): cv.boolean})
+
 SERVICE_TO_METHOD = {
     SERVICE_TURN_ON_AC_VOLUME: {"method": "async_turn_on_ac_volume"},
     SERVICE_TURN_OFF_AC_VOLUME: {"method": "async_turn_off_ac_volume"},
@@ -113,6 +266,9 @@ SERVICE_TO_METHOD = {
     SERVICE_SET_AC_OPEN_TIMER: {
         "method": "async_set_ac_open_timer",
         "schema": SERVICE_SCHEMA_TIMER,},
+    SERVICE_APPLY_STATE: {
+        "method": "async_apply_state",
+        "schema": SERVICE_SCHEMA_APPLY_STATE,},
 }
 
 
@@ -131,33 +287,86 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
     if DATA_KEY not in hass.data:
         hass.data[DATA_KEY] = {}
 
+    if DATA_COORDINATOR not in hass.data:
+        coordinator = ZhimiUpdateCoordinator(
+            hass, SCAN_INTERVAL,
+            config.get(CONF_PARALLEL_POLLS, DEFAULT_PARALLEL_POLLS),
+            config.get(CONF_POLL_TIMEOUT, DEFAULT_POLL_TIMEOUT))
+        hass.data[DATA_COORDINATOR] = coordinator
+
+        @callback
+        def async_stop_coordinator(event):
+            """Stop polling and close the device sockets on shutdown."""
+            coordinator.async_stop()
+            hass.async_add_executor_job(TRACER.stop)
+
+        hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, async_stop_coordinator)
+        if getattr(hass, 'http', None) is not None:
+            hass.http.register_view(ZhimiMetricsView(coordinator))
+        async_setup_tracing(hass)
+    coordinator = hass.data[DATA_COORDINATOR]
+
     host = config.get(CONF_HOST)
+    for option, value in ((CONF_PARALLEL_POLLS, coordinator.parallel_polls),
+                          (CONF_POLL_TIMEOUT, coordinator.poll_timeout)):
+        if config.get(option, value) != value:
+            _LOGGER.error(
+                "Ignoring %s %s of %s, all air conditions are polled with %s "
+                "of the first configured one", option, config[option], host, value)
     token = config.get(CONF_TOKEN)
     name = config.get(CONF_NAME)
     min_temp = config.get(CONF_MIN_TEMP)
     max_temp = config.get(CONF_MAX_TEMP)
+    refresh_tiers = config.get(CONF_REFRESH_TIERS)
+    command_window = config.get(CONF_COMMAND_WINDOW)
+    pipeline_window = config.get(CONF_PIPELINE_WINDOW)
 
     _LOGGER.info("Initializing with host %s (token %s...)", host, token[:5])
 
-    try:
-        device = AirCondition(host, token)
-        device_info = device.info()
-        model = device_info.model
-        unique_id = "{}-{}".format(model, device_info.mac_address)
-        _LOGGER.info(
-            "model: %s, firmware_ver: %s, hardware_ver: %s detected",
-            model,
-            device_info.firmware_version,
-            device_info.hardware_version,
-        )
-    except DeviceException as ex:
-        _LOGGER.error("Device unavailable or token incorrect: %s", ex)
-        raise PlatformNotReady
-
+    device = AirCondition(host, token, refresh_tiers=refresh_tiers,
+                          command_window=command_window,
+                          pipeline_window=pipeline_window)
+    identities = yield from async_load_identities(hass)
+    identity = identities.get(host)
+    if identity is None:
+        try:
+            identity = yield from async_fetch_identity(hass, host, device, 1)
+        except DeviceException as ex:
+            _LOGGER.error("Device unavailable or token incorrect: %s", ex)
+            device.close()
+            raise PlatformNotReady
+    else:
+        _LOGGER.debug("Using cached identity of %s: %s", host, identity)
+        hass.async_create_task(async_refresh_identity(hass, host, device))
+
+    model = identity[ATTR_MODEL]
+    unique_id = identity[ATTR_UNIQUE_ID]
+
+    coordinator.async_add_device(
+        host, device, unique_id,
+        config.get(CONF_MIN_POLL_INTERVAL), config.get(CONF_MAX_POLL_INTERVAL))
     zhimi_air_condition = ZhimiAirCondition(
-        hass, name, device, model, unique_id, min_temp, max_temp)
+        hass, name, device, coordinator, host, model, unique_id,
+        min_temp, max_temp)
     hass.data[DATA_KEY][host] = zhimi_air_condition
-    async_add_devices([zhimi_air_condition], update_before_add=True)
+    hass.data.setdefault(DATA_METRICS, {})[host] = device.metrics
+    async_add_devices([zhimi_air_condition])
+
+    telemetry = config.get(CONF_TELEMETRY)
+    if telemetry is not None:
+        hass.data.setdefault(DATA_TELEMETRY, {})[host] = TelemetrySampler(
+            hass, device, telemetry[CONF_TELEMETRY_INTERVAL],
+            telemetry[CONF_TELEMETRY_BUFFER_SIZE])
+
+    history = config.get(CONF_HISTORY)
+    if history is not None:
+        async_setup_history(hass, coordinator, host, unique_id, history)
+
+    hass.async_create_task(discovery.async_load_platform(
+        hass, 'sensor', SERVICE_DOMAIN,
+        {CONF_HOST: host, CONF_NAME: name, ATTR_UNIQUE_ID: unique_id},
+        config))
 
     async def async_service_handler(service):
         """Map services to methods on ZhimiAirConditioningCompanion."""
@@ -165,75 +374,197 @@ def async_setup_platform(hass, config, async_add_devices, discovery_info=None):
         params = {
             key: value for key, value in service.data.items() if key != ATTR_ENTITY_ID
         }
-        entity_ids = service.data.get(ATTR_ENTITY_ID)
-        if entity_ids:
-            devices = [
-                device
-                for device in hass.data[DATA_KEY].values()
-                if device.entity_id in entity_ids
-            ]
-        else:
-            devices = hass.data[DATA_KEY].values()
+        entity_ids = service.data[ATTR_ENTITY_ID]
+        devices = [
+            device
+            for device in hass.data[DATA_KEY].values()
+            if device.entity_id in entity_ids and hasattr(device, method["method"])
+        ]
+        semaphore = asyncio.Semaphore(SERVICE_PARALLEL_CALLS)
+
+        async def async_call_device(device):
+            """Call the service method of one device."""
+            async with semaphore:
+                return await getattr(device, method["method"])(**params)
+
+        results = await asyncio.gather(
+            *(async_call_device(device) for device in devices),
+            return_exceptions=True)
+
+        failed = []
+        for device, result in zip(devices, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Calling %s of %s failed: %s",
+                              service.service, device.entity_id, result)
+                failed.append(device.entity_id)
+            elif not result:
+                failed.append(device.entity_id)
+        if failed:
+            _LOGGER.warning("%s failed for %s of %s devices: %s",
+                            service.service, len(failed), len(devices),
+                            ", ".join(failed))
 
-        update_tasks = []
         for device in devices:
-            if not hasattr(device, method["method"]):
-                continue
-            await getattr(device, method["method"])(**params)
-            update_tasks.append(device.async_update_ha_state(True))
+            device.async_write_ha_state()
 
-        if update_tasks:
-            await asyncio.wait(update_tasks, loop=hass.loop)
+    for zhimi_service, method in SERVICE_TO_METHOD.items():
+        if hass.services.has_service(SERVICE_DOMAIN, zhimi_service):
+            continue
+        schema = method.get("schema", SERVICE_SCHEMA)
+        hass.services.async_register(
+            SERVICE_DOMAIN, zhimi_service, async_service_handler, schema=schema)
 
 
-    platform = entity_platform.current_platform.get()
+@callback
+def async_setup_tracing(hass):
+    """Register the service switching the tracing of polls on and off."""
 
-    platform.async_register_entity_service(
-        SERVICE_TURN_ON_AC_VOLUME,
-        {vol.Required(ATTR_ENTITY_ID): cv.entity_ids},
-        "async_turn_on_ac_volume",
-    )
-    platform.async_register_entity_service(
-        SERVICE_TURN_OFF_AC_VOLUME,
-        {vol.Required(ATTR_ENTITY_ID): cv.entity_ids},
-        "async_turn_off_ac_volume",
-    )
-    platform.async_register_entity_service(
-        SERVICE_SET_AC_LCD_LEVEL,
-        {vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
-        vol.Required(CONF_BRIGHTNESS, default=3): vol.All(int, vol.Range(min=0, max=6))},
-        "async_set_ac_lcd_level",
-    )
-    platform.async_register_entity_service(
-        SERVICE_SET_AC_SWING_ANGLE,
-        {vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
-        vol.Required(CONF_ANGLE, default=25): vol.All(int, vol.Range(min=0, max=60))},
-        "async_set_ac_swing_angle",
-    )
-    platform.async_register_entity_service(
-        SERVICE_SET_AC_IDLE_TIMER,
-        {vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
-        vol.Required(CONF_TIMER, default=90): vol.All(int, vol.Range(min=0, max=480))},
-        "async_set_ac_idle_timer",
-    )
-    platform.async_register_entity_service(
-        SERVICE_SET_AC_OPEN_TIMER,
-        {vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
-        vol.Required(CONF_TIMER, default=90): vol.All(int, vol.Range(min=0, max=480))},
-        "async_set_ac_open_timer",
+    async def async_set_tracing(service):
+        if service.data[ATTR_ENABLED]:
+            await hass.async_add_executor_job(
+                TRACER.start, hass.config.path(DEFAULT_TRACE_FILE))
+        else:
+            await hass.async_add_executor_job(TRACER.stop)
+
+    hass.services.async_register(
+        SERVICE_DOMAIN, SERVICE_SET_TRACING, async_set_tracing,
+        schema=SERVICE_SCHEMA_SET_TRACING)
+
+
+@callback
+def async_setup_history(hass, coordinator, host, unique_id, history_config):
+    """Record every polled status of host in its on-disk history."""
+    history = DeviceHistory(
+        hass.config.path(HISTORY_DIR, unique_id.replace(':', '')))
+    writer = hass.data.setdefault(DATA_HISTORY, {})[host] = HistoryWriter(history)
+    hass.data.setdefault(DATA_ANALYTICS, {})[host] = DailyAnalytics(
+        history, history_config[CONF_POWER_CURVE],
+        history_config[CONF_SETPOINT_TOLERANCE])
+    bucket = history_config[CONF_ROLLUP_INTERVAL]
+    rollup_after = history_config[CONF_ROLLUP_AFTER] * 86400
+
+    @callback
+    def async_record():
+        """Buffer the latest status, flush to disk through the writer."""
+        status = coordinator.data.get(host)
+        if status is None:
+            return
+
+        now = time.time()
+        compressor_frq = None
+        telemetry = hass.data.get(DATA_TELEMETRY, {}).get(host)
+        if telemetry is not None and telemetry.samples:
+            sampled_at, values = telemetry.samples[-1]
+            if now - sampled_at < SCAN_INTERVAL.total_seconds():
+                compressor_frq = values.get('compressor_frq')
+
+        history.append(int(now), status.temperature, status.target_temp,
+                       status.power, status.mode, status.fan_speed,
+                       compressor_frq)
+        if history.pending >= HISTORY_FLUSH_ROWS:
+            hass.async_create_task(writer.async_write())
+
+    def rollup():
+        history.rollup(bucket, int(time.time()) - rollup_after)
+
+    async def async_rollup(_now):
+        """Flush and downsample samples older than rollup_after days."""
+        await writer.async_write(rollup)
+
+    @callback
+    def async_flush(event):
+        """Write the buffered samples on shutdown."""
+        hass.async_create_task(writer.async_write())
+
+    coordinator.async_add_listener(host, async_record)
+    async_track_time_interval(hass, async_rollup, HISTORY_ROLLUP_JOB_INTERVAL)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_flush)
+
+
+class ZhimiMetricsView(HomeAssistantView):
+    """Serve the request metrics of the fleet to a Prometheus scraper."""
+
+    url = '/api/zhimi/metrics'
+    name = 'api:zhimi:metrics'
+
+    def __init__(self, coordinator):
+        """Initialize the view."""
+        self._coordinator = coordinator
+
+    async def get(self, request):
+        """Return the metrics in the Prometheus text format."""
+        return web.Response(
+            body=self._coordinator.prometheus_metrics(),
+            content_type='text/plain', charset='utf-8')
+
+
+async def async_load_identities(hass):
+    """Return the identities of all known devices, keyed by host."""
+    if DATA_IDENTITIES not in hass.data:
+        store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+
+        async def async_load():
+            return store, (await store.async_load() or {})
+
+        hass.data[DATA_IDENTITIES] = hass.async_create_task(async_load())
+    _, identities = await hass.data[DATA_IDENTITIES]
+    return identities
+
+
+async def async_fetch_identity(hass, host, device, retry_count=3):
+    """Ask the device for its identity and persist it."""
+    device_info = await device.async_info(retry_count)
+    model = device_info.model
+    _LOGGER.info(
+        "model: %s, firmware_ver: %s, hardware_ver: %s detected",
+        model,
+        device_info.firmware_version,
+        device_info.hardware_version,
     )
+    identity = {
+        ATTR_MODEL: model,
+        ATTR_MAC: device_info.mac_address,
+        ATTR_FIRMWARE_VERSION: device_info.firmware_version,
+        ATTR_HARDWARE_VERSION: device_info.hardware_version,
+        ATTR_UNIQUE_ID: "{}-{}".format(model, device_info.mac_address),
+    }
+
+    store, identities = await hass.data[DATA_IDENTITIES]
+    if identities.get(host) != identity:
+        identities[host] = identity
+        store.async_delay_save(lambda: identities, STORAGE_SAVE_DELAY)
+    return identity
+
+
+async def async_refresh_identity(hass, host, device):
+    """Refresh a cached identity in the background."""
+    cached = dict((await async_load_identities(hass))[host])
+    try:
+        identity = await async_fetch_identity(hass, host, device)
+    except DeviceException as ex:
+        _LOGGER.debug("Unable to refresh the identity of %s: %s", host, ex)
+        return
+    if identity[ATTR_UNIQUE_ID] != cached[ATTR_UNIQUE_ID]:
+        _LOGGER.warning(
+            "The device at %s changed from %s to %s, restart Home Assistant "
+            "to pick up the new device", host,
+            cached[ATTR_UNIQUE_ID], identity[ATTR_UNIQUE_ID])
 
 
 class ZhimiAirCondition(ClimateEntity):
     """Representation of a Zhimi Air Condition."""
 
-    def __init__(self, hass, name, device, model, unique_id,
-                 min_temp, max_temp):
+    def __init__(self, hass, name, device, coordinator, host, model,
+                 unique_id, min_temp, max_temp):
 
         """Initialize the climate device."""
         self.hass = hass
         self._name = name
         self._device = device
+        self._coordinator = coordinator
+        self._host = host
+        self._unsub_coordinator = None
+        self._unsub_verify = None
         self._model = model
         self._unique_id = unique_id
         self._available = False
@@ -247,6 +578,13 @@ class ZhimiAirCondition(ClimateEntity):
             ATTR_VOLUME: None,
             ATTR_IDLE_TIMER: None,
             ATTR_OPEN_TIMER: None,
+            ATTR_REQUESTS_SAVED: None,
+            ATTR_COMMANDS_COALESCED: None,
+            ATTR_COMMANDS_SUPPRESSED: None,
+            ATTR_HANDSHAKES: None,
+            ATTR_HEALTH: None,
+            ATTR_STATE_WRITES: 0,
+            ATTR_STATE_WRITES_SKIPPED: 0,
         }
         self._min_temp = min_temp
         self._max_temp = max_temp
@@ -258,15 +596,23 @@ class ZhimiAirCondition(ClimateEntity):
         self._preset_mode = None
         self._sleep = None
         self._comfort = None
+        self._last_status = None
+        self._state_writes = 0
+        self._state_writes_skipped = 0
 
     @asyncio.coroutine
     def _try_command(self, mask_error, func, *args, **kwargs):
         """Call a command handling error messages."""
         try:
-            result = yield from self.hass.async_add_job(
-                partial(func, *args, **kwargs))
+            result = yield from func(*args, **kwargs)
 
             _LOGGER.debug("Response received: %s", result)
+            status = self._device.cached_status
+            if result == SUCCESS and status is not None:
+                self._update_from_status(status)
+                self._async_schedule_verify()
+            if result == SUCCESS:
+                self._coordinator.async_command_sent(self._host)
             self.schedule_update_ha_state()
 
             return result == SUCCESS
@@ -279,7 +625,7 @@ class ZhimiAirCondition(ClimateEntity):
     def async_turn_on(self, speed: str = None, **kwargs) -> None:
         """Turn the miio AC on."""
         result = yield from self._try_command(
-            "Turning the miio AC on failed.", self._device.on)
+            "Turning the miio AC on failed.", self._device.async_on)
         if result:
             self._state = True
 
@@ -287,56 +633,126 @@ class ZhimiAirCondition(ClimateEntity):
     def async_turn_off(self, **kwargs) -> None:
         """Turn the miio AC off."""
         result = yield from self._try_command(
-            "Turning the miio AC off failed.", self._device.off)
+            "Turning the miio AC off failed.", self._device.async_off)
         if result:
             self._state = False
 
+    async def async_added_to_hass(self):
+        """Subscribe to the fleet coordinator and poll in the background."""
+        self._unsub_coordinator = self._coordinator.async_add_listener(
+            self._host, self._handle_coordinator_update)
+        self.async_schedule_update_ha_state(True)
+
+    async def async_will_remove_from_hass(self):
+        """Unsubscribe from the fleet coordinator."""
+        if self._unsub_coordinator is not None:
+            self._unsub_coordinator()
+            self._unsub_coordinator = None
+        if self._unsub_verify is not None:
+            self._unsub_verify()
+            self._unsub_verify = None
+
+    @callback
+    def _async_schedule_verify(self):
+        """Read back the changed properties once the commands settled."""
+        if self._unsub_verify is not None:
+            self._unsub_verify()
+        self._unsub_verify = async_call_later(
+            self.hass, VERIFY_DELAY, self._async_verify)
+
+    async def _async_verify(self, _now):
+        """Correct the optimistic state with the values of the device."""
+        self._unsub_verify = None
+        try:
+            status = await self._device.async_verify()
+        except DeviceException as ex:
+            _LOGGER.debug("Verifying the state after a command failed: %s", ex)
+            return
+        self._update_from_status(status)
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Apply the status polled by the coordinator if anything changed."""
+        if self._update_from_status(self._coordinator.data.get(self._host)):
+            self._state_writes += 1
+            self._state_attrs.update({
+                ATTR_STATE_WRITES: self._state_writes,
+                ATTR_STATE_WRITES_SKIPPED: self._state_writes_skipped,
+            })
+            with TRACER.span('state_write', host=self._host):
+                self.async_write_ha_state()
+        else:
+            self._state_writes_skipped += 1
+
     @asyncio.coroutine
     def async_update(self):
         """Update the state of this climate device."""
-        try:
-            state = yield from self.hass.async_add_job(self._device.status)
-            _LOGGER.debug("Got new state: %s", state)
-            self._available = True
-            self._state_attrs.update(
-                {
-                    ATTR_TEMPERATURE: state.target_temp,
-                    ATTR_HVAC_MODE: state.mode if self._state else "off",
-                    ATTR_SWING_ANGLE: state.swing_angle,
-                    ATTR_LCD_SETTING: LcdBrightness(state.lcd_setting).name,
-                    ATTR_VOLUME: state.volume,
-                    ATTR_IDLE_TIMER: state.idle_timer,
-                    ATTR_OPEN_TIMER: state.open_timer,
-                }
-            )
-
-            if state.power == "off":
-                self._hvac_mode = HVAC_MODE_OFF
-                self._state = False
-            else:
-                if state.mode == "automode":
-                    self._last_on_operation = HVAC_MODE_OFF
-                else:
-                    self._last_on_operation = OperationMode[state.mode].value
-                self._hvac_mode = self._last_on_operation
-                self._state = True
-
-            self._target_temperature = state.target_temp
-            self._current_temperature = state.temperature
-            self._fan_speed = FanSpeed(state.fan_speed).name
-            self._swing_mode = SwingMode(state.swing_setting).name
-            self._comfort = state.comfort
-            self._sleep = state.sleep
-            if state.comfort == 'on':
-                self._preset_mode = PRESET_COMFORT
-            elif state.sleep == 'on':
-                self._preset_mode = PRESET_SLEEP
+        with TRACER.span('async_update', host=self._host):
+            state = yield from self._coordinator.async_poll_device(self._host)
+            with TRACER.span('state_update', host=self._host):
+                self._update_from_status(state)
+
+    def _update_from_status(self, state):
+        """Update the attributes from a status, None marks the AC unavailable.
+
+        Returns False without touching anything when neither the
+        availability nor any field of the status changed.
+        """
+        if state is None:
+            changed = self._available
+            self._available = False
+            self._last_status = None
+            return changed
+
+        changes = state.diff(self._last_status)
+        if self._available and not changes:
+            return False
+
+        _LOGGER.debug("Got new state: %s, changed: %s", state, changes)
+        self._available = True
+        self._last_status = state
+        self._state_attrs.update(
+            {
+                ATTR_TEMPERATURE: state.target_temp,
+                ATTR_HVAC_MODE: state.mode if state.power == "on" else "off",
+                ATTR_SWING_ANGLE: state.swing_angle,
+                ATTR_LCD_SETTING: state.lcd_brightness.name,
+                ATTR_VOLUME: state.volume,
+                ATTR_IDLE_TIMER: state.idle_timer,
+                ATTR_OPEN_TIMER: state.open_timer,
+                ATTR_REQUESTS_SAVED: self._device.requests_saved_per_hour,
+                ATTR_COMMANDS_COALESCED: self._device.commands_coalesced,
+                ATTR_COMMANDS_SUPPRESSED: self._device.commands_suppressed,
+                ATTR_HANDSHAKES: self._device.handshakes_per_hour,
+                ATTR_HEALTH: self._device.health.state,
+            }
+        )
+
+        if state.power == "off":
+            self._hvac_mode = HVAC_MODE_OFF
+            self._state = False
+        else:
+            if state.mode == "automode":
+                self._last_on_operation = HVAC_MODE_OFF
             else:
-                self._preset_mode = PRESET_NONE
+                self._last_on_operation = OperationMode[state.mode].value
+            self._hvac_mode = self._last_on_operation
+            self._state = True
 
-        except DeviceException as ex:
-            self._available = False
-            _LOGGER.error("Got exception while fetching the state: %s", ex)
+        self._target_temperature = state.target_temp
+        self._current_temperature = state.temperature
+        self._fan_speed = state.fan_mode.name
+        self._swing_mode = state.swing_mode.name
+        self._comfort = state.comfort
+        self._sleep = state.sleep
+        if state.comfort == 'on':
+            self._preset_mode = PRESET_COMFORT
+        elif state.sleep == 'on':
+            self._preset_mode = PRESET_SLEEP
+        else:
+            self._preset_mode = PRESET_NONE
+        return True
 
     @property
     def supported_features(self):
@@ -360,8 +776,8 @@ class ZhimiAirCondition(ClimateEntity):
 
     @property
     def should_poll(self):
-        """Return the polling state."""
-        return True
+        """Return the polling state, the coordinator polls the fleet."""
+        return False
 
     @property
     def unique_id(self):
@@ -411,7 +827,7 @@ class ZhimiAirCondition(ClimateEntity):
 
         yield from self._try_command(
             "Setting temperature of the miio AC failed.",
-            self._device.set_temperature, self._target_temperature)
+            self._device.async_set_temperature, self._target_temperature)
 
 
     @property
@@ -434,21 +850,21 @@ class ZhimiAirCondition(ClimateEntity):
         """Set new target hvac mode."""
         if hvac_mode == OperationMode.off.value:
             result = yield from self._try_command(
-                "Turning the ac mode to off failed.", self._device.off)
+                "Turning the ac mode to off failed.", self._device.async_off)
             if result:
                 self._state = False
                 self._hvac_mode = HVAC_MODE_OFF
         else:
             if self._hvac_mode == HVAC_MODE_OFF:
                 result = yield from self._try_command(
-                    "Turning the ac mode to on failed.", self._device.on)
+                    "Turning the ac mode to on failed.", self._device.async_on)
                 if not result:
                     return
             self._hvac_mode = OperationMode(hvac_mode).name
             self._state = True
             result = yield from self._try_command(
                 "Setting hvac mode of the ac failed.",
-                self._device.set_mode, self._hvac_mode)
+                self._device.async_set_mode, self._hvac_mode)
             if result:
                 self.async_update()
 
@@ -469,29 +885,29 @@ class ZhimiAirCondition(ClimateEntity):
             if self._comfort != "off":
                 yield from self._try_command(
                     "Turn off comfort preset of the miio AC failed.",
-                    self._device.set_comfort, 'off')
+                    self._device.async_set_comfort, 'off')
             if self._sleep != "off":
                 yield from self._try_command(
                     "Turn off silent preset of the miio AC failed.",
-                    self._device.set_sleep, 'off')
+                    self._device.async_set_sleep, 'off')
         elif preset_mode == PRESET_COMFORT:
             if self._comfort != "on":
                 yield from self._try_command(
                     "Turn on comfort preset of the miio AC failed.",
-                    self._device.set_comfort, 'on')
+                    self._device.async_set_comfort, 'on')
             if self._sleep != "off":
                 yield from self._try_command(
                     "Turn off silent preset of the miio AC failed.",
-                    self._device.set_sleep, 'off')
+                    self._device.async_set_sleep, 'off')
         elif preset_mode == PRESET_SLEEP:
             if self._sleep != "on":
                 yield from self._try_command(
                     "Turn on silent preset of the miio AC failed.",
-                    self._device.set_sleep, 'on')
+                    self._device.async_set_sleep, 'on')
             if self._comfort != "off":
                 yield from self._try_command(
                     "Turn off comfort preset of the miio AC failed.",
-                    self._device.set_comfort, 'off')
+                    self._device.async_set_comfort, 'off')
 
     @property
     def swing_mode(self):
@@ -509,19 +925,19 @@ class ZhimiAirCondition(ClimateEntity):
         if self.supported_features & SUPPORT_SWING_MODE == 0:
             return
 
-        if swing_mode == 'Off':
+        if swing_mode == SwingMode.off.name:
             yield from  self._try_command(
                 "Setting swing mode of the miio AC failed.",
-                self._device.set_swing, 'off')
+                self._device.async_set_swing, 'off')
         else:
             yield from  self._try_command(
                 "Setting swing mode of the miio AC failed.",
-                self._device.set_swing, 'on')
+                self._device.async_set_swing, 'on')
             
             swing_end = int(swing_mode[-2:])
             yield from  self._try_command(
                 "Setting Vertical Swing End of the miio AC failed.",
-                self._device.set_ver_range, swing_end)
+                self._device.async_set_ver_range, swing_end)
 
     @property
     def fan_mode(self):
@@ -546,47 +962,58 @@ class ZhimiAirCondition(ClimateEntity):
 
         yield from self._try_command(
             "Setting fan speed of the miio AC failed.",
-            self._device.set_fan_speed, fan_speed_value)
+            self._device.async_set_fan_speed, fan_speed_value)
 
     @asyncio.coroutine
     def async_turn_on_ac_volume(self):
         """Setting the volume on."""
-        yield from  self._try_command(
+        return (yield from self._try_command(
             "Setting volume on of the miio AC failed.",
-            self._device.set_volume, "on")
+            self._device.async_set_volume, "on"))
 
     @asyncio.coroutine
     def async_turn_off_ac_volume(self):
         """Setting the volume to off."""
-        yield from  self._try_command(
+        return (yield from self._try_command(
             "Setting volume off of the miio AC failed.",
-            self._device.set_volume, "off")
+            self._device.async_set_volume, "off"))
 
     @asyncio.coroutine
     def async_set_ac_lcd_level(self, brightness):
         """Setting the lcd level."""
-        yield from  self._try_command(
+        return (yield from self._try_command(
             "Setting lcd level of the miio AC failed.",
-            self._device.set_lcd_level, brightness)
+            self._device.async_set_lcd_level, brightness))
 
     @asyncio.coroutine
     def async_set_ac_swing_angle(self, angle):
         """Setting the swing vertical angle."""
-        yield from  self._try_command(
+        return (yield from self._try_command(
             "Setting lcd level of the miio AC failed.",
-            self._device.set_swing_angle, angle)
+            self._device.async_set_swing_angle, angle))
 
     @asyncio.coroutine
     def async_set_ac_idle_timer(self, timer):
         """Setting the AC idle timer."""
-        yield from  self._try_command(
+        return (yield from self._try_command(
             "Setting idle timer of the miio AC failed.",
-            self._device.set_idle_timer, timer)
+            self._device.async_set_idle_timer, timer))
 
     @asyncio.coroutine
     def async_set_ac_open_timer(self, timer):
         """Setting the AC open timer."""
-        yield from  self._try_command(
+        return (yield from self._try_command(
             "Setting open timer of the miio AC failed.",
-            self._device.set_open_timer, timer)
-
+            self._device.async_set_open_timer, timer))
+
+    async def _async_apply(self, desired):
+        await self._device.async_apply(desired)
+        return SUCCESS
+
+    async def async_apply_state(self, **desired):
+        """Send only the commands needed to reach the desired state."""
+        if ATTR_TEMPERATURE in desired:
+            desired['target_temp'] = desired.pop(ATTR_TEMPERATURE)
+        return await self._try_command(
+            "Applying the state to the miio AC failed: %s",
+            self._async_apply, desired)
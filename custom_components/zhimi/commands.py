@@ -0,0 +1,62 @@
+"""
+Per-device command queue for the Zhimi Air Condition.
+
+Commands are held back for a short window. When the same command is queued
+again within the window (dragging the thermostat slider, for example) only
+the last value is sent and every caller receives its result.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_COMMAND_WINDOW = 0.5
+
+
+class CommandQueue:
+    """Coalesce rapid commands of one device to the last value per command."""
+
+    def __init__(self, send, window: float = DEFAULT_COMMAND_WINDOW) -> None:
+        self._send = send
+        self._window = window
+        self._pending = OrderedDict()
+        self._flush_task = None
+        self.coalesced = 0
+
+    async def put(self, command: str, parameters):
+        """Queue a command and return the result of the command sent."""
+        if self._window <= 0:
+            return await self._send(command, parameters)
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        if command in self._pending:
+            _, futures = self._pending.pop(command)
+            self.coalesced += 1
+            _LOGGER.debug("Coalescing %s, sending %s instead", command, parameters)
+        else:
+            futures = []
+        futures.append(future)
+        self._pending[command] = (parameters, futures)
+
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        await asyncio.sleep(self._window)
+        self._flush_task = None
+        pending, self._pending = self._pending, OrderedDict()
+
+        for command, (parameters, futures) in pending.items():
+            try:
+                result = await self._send(command, parameters)
+            except Exception as ex:  # pylint: disable=broad-except
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ex)
+            else:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
@@ -0,0 +1,178 @@
+"""
+Fleet update coordinator for Zhimi Air Conditions.
+
+Polls every configured air condition at its own phase within its poll
+interval, bounded by a parallelism limit and a per-device timeout, and hands
+the results to the subscribed entities. Spreading the polls keeps the fleet
+from bursting all of its UDP requests in the same second. The interval of
+each device adapts to its activity between a minimum and a maximum.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from functools import partial
+
+from miio import DeviceException
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .health import DeviceUnavailable
+from .metrics import render_prometheus
+from .schedule import (
+    AdaptiveInterval,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    next_poll_delay,
+    poll_phase,
+)
+from .tracing import TRACER
+from .transport import PACKET_RATE
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PARALLEL_POLLS = 10
+DEFAULT_POLL_TIMEOUT = 20
+
+
+class ZhimiUpdateCoordinator:
+    """Poll all air conditions of the fleet and notify their entities."""
+
+    def __init__(self, hass, update_interval: timedelta,
+                 parallel_polls: int = DEFAULT_PARALLEL_POLLS,
+                 poll_timeout: float = DEFAULT_POLL_TIMEOUT) -> None:
+        self.hass = hass
+        self.update_interval = update_interval
+        self.parallel_polls = parallel_polls
+        self.poll_timeout = poll_timeout
+        self.data = {}
+        self._devices = {}
+        self._listeners = {}
+        self._poll_keys = {}
+        self._intervals = {}
+        self._last_polls = {}
+        self._unsub_polls = {}
+        self._polling = set()
+        self._stopped = False
+        self._semaphore = asyncio.Semaphore(parallel_polls)
+
+    @callback
+    def async_add_device(self, host: str, device, unique_id: str = None,
+                         min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+                         max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL) -> None:
+        """Add an AirCondition to the fleet and start polling it at its phase."""
+        self._devices[host] = device
+        self._poll_keys[host] = unique_id or host
+        self._intervals[host] = AdaptiveInterval(
+            self.update_interval.total_seconds(),
+            min_poll_interval, max_poll_interval)
+        self._async_schedule_poll(host)
+
+    @callback
+    def async_command_sent(self, host: str) -> None:
+        """Poll host fast for a while to confirm a command.
+
+        The next poll reads back the commanded properties even if their
+        refresh tier is slow. While a poll of host is running only the
+        interval is shortened, the poll schedules the next one when it ends.
+        """
+        if self._stopped or host not in self._intervals:
+            return
+        self._devices[host].expire_unverified()
+        self._intervals[host].boost()
+        if host not in self._polling:
+            self._async_schedule_poll(host)
+
+    @callback
+    def async_add_listener(self, host: str, update_callback):
+        """Call update_callback whenever a new status of host arrives."""
+        self._listeners.setdefault(host, []).append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._listeners[host].remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop polling and release the sockets of all devices."""
+        self._stopped = True
+        for unsub in self._unsub_polls.values():
+            unsub()
+        self._unsub_polls.clear()
+        for device in self._devices.values():
+            device.close()
+
+    @property
+    def peak_packets_per_second(self) -> int:
+        """Most miIO packets sent within one second in the last minutes."""
+        return PACKET_RATE.peak
+
+    def prometheus_metrics(self) -> str:
+        """Request and poll metrics of the fleet in the Prometheus text format."""
+        return render_prometheus(
+            {host: device.metrics for host, device in self._devices.items()},
+            self.peak_packets_per_second)
+
+    async def async_poll_device(self, host: str):
+        """Poll a single device and store its status (None when failed)."""
+        device = self._devices[host]
+        async with self._semaphore:
+            start = self.hass.loop.time()
+            try:
+                status = await asyncio.wait_for(
+                    device.async_status(), self.poll_timeout)
+            except DeviceUnavailable as ex:
+                _LOGGER.debug("Skipping the poll: %s", ex)
+                status = None
+            except asyncio.TimeoutError:
+                _LOGGER.error("Timeout fetching the state of %s", host)
+                status = None
+            except DeviceException as ex:
+                _LOGGER.error("Got exception while fetching the state: %s", ex)
+                status = None
+            device.metrics.observe_poll(
+                self.hass.loop.time() - start, status is not None)
+
+        self.data[host] = status
+        return status
+
+    @callback
+    def _async_notify(self, host: str) -> None:
+        for update_callback in self._listeners.get(host, []):
+            update_callback()
+
+    @callback
+    def _async_schedule_poll(self, host: str) -> None:
+        # A single timer per host, whatever asked for the next poll.
+        unsub = self._unsub_polls.pop(host, None)
+        if unsub is not None:
+            unsub()
+        interval = self._intervals[host].interval
+        delay = next_poll_delay(
+            time.time(), poll_phase(self._poll_keys[host], interval), interval)
+        self._unsub_polls[host] = async_call_later(
+            self.hass, delay, partial(self._async_handle_poll, host))
+
+    async def _async_handle_poll(self, host: str, _now) -> None:
+        # A command may have scheduled another poll before this one started.
+        unsub = self._unsub_polls.pop(host, None)
+        if unsub is not None:
+            unsub()
+        self._polling.add(host)
+        now = self.hass.loop.time()
+        if host in self._last_polls:
+            self._devices[host].metrics.observe_interval(
+                now - self._last_polls[host])
+        self._last_polls[host] = now
+        try:
+            with TRACER.span('poll', host=host):
+                status = await self.async_poll_device(host)
+                self._intervals[host].update(status)
+                self._async_notify(host)
+        finally:
+            self._polling.discard(host)
+            if not self._stopped:
+                self._async_schedule_poll(host)
@@ -0,0 +1,197 @@
+"""
+Broadcast discovery of Zhimi Air Conditions on the LAN.
+
+Sends a single miIO hello to the broadcast address and collects the replies
+of all devices at once. A hello reply carries the device id and the device
+clock, but the token only while the device is not provisioned yet, so the
+tokens of an existing inventory are matched by device id (or host, for
+entries without one). Every device with a token is asked for miIO.info
+concurrently, the handshake is skipped by reusing the hello reply, and only
+zhimi.aircondition.ma1 units are kept.
+
+    python -m custom_components.zhimi.discovery --inventory inventory.yaml
+    python -m custom_components.zhimi.discovery --inventory inventory.yaml \\
+        --broadcast 192.168.1.255 --format climate --output zhimi.yaml
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import yaml
+
+from .airconditioning import AirCondition, PROPERTY_TIERS, ZHIMI_AC_MA1
+from .fleet import UNIT_ERRORS, load_inventory
+from .transport import HEADER, HELLO, MIIO_PORT, PACKET_RATE
+
+DEFAULT_BROADCAST = '255.255.255.255'
+DEFAULT_DISCOVERY_TIMEOUT = 1
+# Units asked for miIO.info at the same time.
+DEFAULT_PARALLEL = 100
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+UNKNOWN_TOKENS = (b'\x00' * 16, b'\xff' * 16)
+
+
+def parse_hello(data: bytes):
+    """Return (device id, stamp, token or None) of a hello reply, None if it is none."""
+    if len(data) != HEADER.size + 16:
+        return None
+    magic, length, _, device_id, stamp = HEADER.unpack_from(data)
+    if magic != 0x2131 or length != len(data):
+        return None
+    token = data[HEADER.size:]
+    return device_id, stamp, None if token in UNKNOWN_TOKENS else token.hex()
+
+
+class HelloCollector(asyncio.DatagramProtocol):
+    """Collect the hello replies of all devices answering a broadcast."""
+
+    def __init__(self) -> None:
+        self.devices = {}
+
+    def datagram_received(self, data, addr) -> None:
+        hello = parse_hello(data)
+        if hello is None or addr[0] in self.devices:
+            return
+        device_id, stamp, token = hello
+        self.devices[addr[0]] = {
+            'host': addr[0],
+            'device_id': device_id,
+            'stamp': stamp,
+            'token': token,
+            'received': time.monotonic(),
+        }
+
+
+async def async_discover(address: str = DEFAULT_BROADCAST,
+                         timeout: float = DEFAULT_DISCOVERY_TIMEOUT,
+                         port: int = MIIO_PORT) -> list:
+    """Broadcast one hello, return a dict per device answering within timeout."""
+    loop = asyncio.get_event_loop()
+    transport, collector = await loop.create_datagram_endpoint(
+        HelloCollector, local_addr=('0.0.0.0', 0), allow_broadcast=True)
+    try:
+        transport.sendto(HELLO, (address, port))
+        PACKET_RATE.record()
+        await asyncio.sleep(timeout)
+    finally:
+        transport.close()
+    return sorted(collector.devices.values(), key=lambda device: device['device_id'])
+
+
+async def async_identify(devices: list, known: list = (),
+                         parallel: int = DEFAULT_PARALLEL,
+                         timeout: float = 2) -> list:
+    """Ask every discovered device with a known token for its model.
+
+    known are inventory entries; their token and name are taken over by
+    device id or host. Adds model, mac, token and name to the devices, a
+    device without token gets model None, a failing one (an invalid token
+    or an unreachable device) an error.
+    """
+    by_device_id = {unit['device_id']: unit for unit in known if 'device_id' in unit}
+    by_host = {unit['host']: unit for unit in known}
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def identify(found):
+        unit = by_device_id.get(found['device_id']) or by_host.get(found['host'], {})
+        found['name'] = unit.get('name', found['host'])
+        found['token'] = found['token'] or unit.get('token')
+        found['model'] = None
+        if found['token'] is None:
+            return found
+
+        async with semaphore:
+            device = None
+            try:
+                device = AirCondition(found['host'], found['token'],
+                                      refresh_tiers=NO_CACHE, command_window=0)
+                device._transport.timeout = timeout
+                session = device._transport.session
+                if not session.established:
+                    # The hello reply was the handshake.
+                    session.establish(
+                        found['device_id'].to_bytes(4, 'big'),
+                        found['stamp'] + int(time.monotonic() - found['received']))
+                info = await device.async_info(retry_count=1)
+            except UNIT_ERRORS as ex:
+                found['error'] = str(ex)
+            else:
+                found['model'] = info.model
+                found['mac'] = info.mac_address
+            finally:
+                if device is not None:
+                    device.close()
+        return found
+
+    return await asyncio.gather(*(identify(found) for found in devices))
+
+
+def inventory_entries(devices: list, model: str = ZHIMI_AC_MA1) -> list:
+    """Inventory entries of the identified devices of model."""
+    return [
+        {'host': device['host'], 'token': device['token'],
+         'name': device['name'], 'device_id': device['device_id']}
+        for device in devices if device['model'] == model
+    ]
+
+
+def climate_entries(entries: list) -> dict:
+    """The inventory as climate section of a Home Assistant configuration."""
+    return {'climate': [
+        {'platform': 'zhimi', 'host': entry['host'], 'token': entry['token'],
+         'name': entry['name']}
+        for entry in entries
+    ]}
+
+
+async def async_main(args) -> int:
+    known = load_inventory(args.inventory) if args.inventory else []
+    start = time.monotonic()
+    devices = await async_discover(args.broadcast, args.timeout, args.port)
+    devices = await async_identify(devices, known, args.parallel, args.timeout)
+    entries = inventory_entries(devices)
+
+    for device in devices:
+        if device['model'] is None:
+            print("%s (device id %s) answered, %s" % (
+                device['host'], device['device_id'],
+                device.get('error', "its token is unknown")), file=sys.stderr)
+    print("Found %d %s of %d devices in %.2f seconds" % (
+        len(entries), ZHIMI_AC_MA1, len(devices), time.monotonic() - start),
+          file=sys.stderr)
+
+    data = climate_entries(entries) if args.format == 'climate' else entries
+    text = yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0 if entries else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--inventory',
+                        help="YAML inventory with the tokens of known units")
+    parser.add_argument('--broadcast', default=DEFAULT_BROADCAST,
+                        help="broadcast address of the LAN")
+    parser.add_argument('--port', type=int, default=MIIO_PORT)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_DISCOVERY_TIMEOUT,
+                        help="seconds to wait for replies")
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL,
+                        help="units asked for their model at the same time")
+    parser.add_argument('--format', choices=['inventory', 'climate'],
+                        default='inventory',
+                        help="a fleet inventory or a climate configuration section")
+    parser.add_argument('--output', help="file to write instead of stdout")
+    args = parser.parse_args()
+    try:
+        sys.exit(asyncio.run(async_main(args)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
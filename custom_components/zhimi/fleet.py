@@ -0,0 +1,232 @@
+"""
+Command line interface for a fleet of Zhimi Air Conditions.
+
+Runs status, info or any command of AirCondition against every unit of a
+YAML inventory concurrently and prints one JSON line per unit as soon as it
+answers. The inventory is a list of units with host, token and an optional
+name; the climate section of a Home Assistant configuration works as well,
+entries of other platforms are skipped.
+
+    - host: 192.168.1.10
+      token: 0123456789abcdef0123456789abcdef
+      name: Living room
+
+    python -m custom_components.zhimi.fleet inventory.yaml status
+    python -m custom_components.zhimi.fleet inventory.yaml set_temperature 26
+    python -m custom_components.zhimi.fleet inventory.yaml status --watch 30
+"""
+import argparse
+import asyncio
+import enum
+import inspect
+import json
+import sys
+import time
+
+import yaml
+from miio import DeviceException
+from miio.device import DeviceInfo
+
+from .airconditioning import AirCondition, AirConditionStatus, PROPERTY_TIERS
+
+DEFAULT_PARALLEL = 10
+NO_CACHE = {tier: 0 for tier in PROPERTY_TIERS}
+# Failures of a single unit: an invalid token (ValueError), an unresolvable
+# host or a socket error (OSError) and errors of the device.
+UNIT_ERRORS = (DeviceException, OSError, ValueError)
+
+
+def load_inventory(path: str) -> list:
+    """Return the units of an inventory file as dicts with host, token, name.
+
+    The device id written by the discovery is kept when present.
+    """
+    with open(path) as inventory_file:
+        data = yaml.safe_load(inventory_file) or []
+    if isinstance(data, dict):
+        data = data.get('climate', data.get('devices', []))
+
+    units = []
+    for entry in data:
+        if entry.get('platform', 'zhimi') != 'zhimi':
+            continue
+        unit = {
+            'host': entry['host'],
+            'token': entry['token'],
+            'name': entry.get('name', entry['host']),
+        }
+        if 'device_id' in entry:
+            unit['device_id'] = entry['device_id']
+        units.append(unit)
+    return units
+
+
+def fleet_commands() -> dict:
+    """Commands runnable from the command line, mapped to AirCondition methods."""
+    commands = {'status': 'async_status', 'info': 'async_info'}
+    for name in dir(AirCondition):
+        if name.startswith('async_') and (
+                name[6:] in ('on', 'off') or name.startswith('async_set_')):
+            commands[name[6:]] = name
+    return commands
+
+
+def parse_arguments(method, arguments: list) -> list:
+    """Convert command line arguments using the annotations of method."""
+    parameters = [parameter for name, parameter
+                  in inspect.signature(method).parameters.items()
+                  if name != 'self' and parameter.default is inspect.Parameter.empty]
+    if len(arguments) != len(parameters):
+        raise ValueError("%s expects %s" % (
+            method.__name__[6:], ", ".join(p.name for p in parameters) or "no arguments"))
+    return [
+        parameter.annotation(argument)
+        if parameter.annotation in (int, float) else argument
+        for parameter, argument in zip(parameters, arguments)
+    ]
+
+
+def _jsonable(result):
+    if isinstance(result, AirConditionStatus):
+        return result.__json__()
+    if isinstance(result, DeviceInfo):
+        return result.raw
+    return result
+
+
+def _json_fields(fields: dict) -> dict:
+    return {field: value.name if isinstance(value, enum.Enum) else value
+            for field, value in fields.items()}
+
+
+def emit(line: dict) -> None:
+    print(json.dumps(line, default=str), flush=True)
+
+
+def _device(unit: dict, timeout: float) -> AirCondition:
+    device = AirCondition(unit['host'], unit['token'],
+                          refresh_tiers=NO_CACHE, command_window=0)
+    device._transport.timeout = timeout
+    return device
+
+
+async def run_command(units: list, method: str, arguments: list,
+                      parallel: int = DEFAULT_PARALLEL, timeout: float = 5):
+    """Run a command on all units, yield one result dict per unit as it completes."""
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def call(unit):
+        line = {'host': unit['host'], 'name': unit['name']}
+        async with semaphore:
+            start = time.monotonic()
+            device = None
+            try:
+                device = _device(unit, timeout)
+                result = await getattr(device, method)(*arguments)
+            except UNIT_ERRORS as ex:
+                line.update(ok=False, error=str(ex))
+            else:
+                line.update(ok=True, result=_jsonable(result))
+            finally:
+                if device is not None:
+                    device.close()
+            line['elapsed_ms'] = round((time.monotonic() - start) * 1000, 1)
+        return line
+
+    for finished in asyncio.as_completed([call(unit) for unit in units]):
+        yield await finished
+
+
+async def watch(units: list, interval: float, parallel: int = DEFAULT_PARALLEL,
+                timeout: float = 5) -> None:
+    """Poll all units every interval seconds, print only the changed fields.
+
+    A unit with an invalid token is reported once and left out.
+    """
+    semaphore = asyncio.Semaphore(parallel)
+    devices = {}
+    for unit in units:
+        try:
+            devices[unit['host']] = _device(unit, timeout)
+        except ValueError as ex:
+            emit({'host': unit['host'], 'name': unit['name'], 'ok': False,
+                  'error': str(ex)})
+    names = {unit['host']: unit['name'] for unit in units}
+    previous = {}
+    errors = {}
+
+    async def poll(host):
+        async with semaphore:
+            try:
+                return host, await devices[host].async_status(), None
+            except UNIT_ERRORS as ex:
+                return host, None, ex
+
+    try:
+        while True:
+            start = time.monotonic()
+            for finished in asyncio.as_completed([poll(host) for host in devices]):
+                host, status, error = await finished
+                line = {'host': host, 'name': names[host], 'ts': int(time.time())}
+                if status is None:
+                    # Report a failing unit once, not on every poll.
+                    if errors.get(host) is not type(error):
+                        line.update(ok=False, error=str(error))
+                        emit(line)
+                    errors[host] = type(error)
+                    previous.pop(host, None)
+                    continue
+                errors.pop(host, None)
+                changes = status.diff(previous.get(host))
+                previous[host] = status
+                if changes:
+                    line.update(ok=True, changed=_json_fields(changes))
+                    emit(line)
+            await asyncio.sleep(max(0, interval - (time.monotonic() - start)))
+    finally:
+        for device in devices.values():
+            device.close()
+
+
+async def async_main(args, method: str, arguments: list) -> int:
+    units = load_inventory(args.inventory)
+    if args.watch:
+        await watch(units, args.watch, args.parallel, args.timeout)
+        return 0
+
+    failed = 0
+    async for line in run_command(units, method, arguments, args.parallel,
+                                  args.timeout):
+        failed += not line['ok']
+        emit(line)
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('inventory', help="YAML inventory of the units")
+    parser.add_argument('command', choices=sorted(fleet_commands()))
+    parser.add_argument('arguments', nargs='*')
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL,
+                        help="units talked to at the same time")
+    parser.add_argument('--timeout', type=float, default=5,
+                        help="seconds to wait for a reply")
+    parser.add_argument('--watch', type=float, metavar='INTERVAL',
+                        help="poll the status every INTERVAL seconds and "
+                             "print only the changed fields")
+    args = parser.parse_args()
+    if args.watch and args.command != 'status':
+        parser.error("--watch only works with status")
+    method = fleet_commands()[args.command]
+    try:
+        arguments = parse_arguments(getattr(AirCondition, method), args.arguments)
+    except ValueError as ex:
+        parser.error(str(ex))
+    try:
+        sys.exit(asyncio.run(async_main(args, method, arguments)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Health state machine of a Zhimi Air Condition.
+
+    healthy --failure--> degraded --failures--> open --backoff--> half_open
+       ^                    |                    ^                   |
+       +-----success--------+                    +-----failure-------+
+       +--------------------------success----------------------------+
+
+A device which stops answering is no longer polled at all while the circuit
+is open. The backoff doubles with every failed probe, up to a limit.
+"""
+import logging
+import time
+
+from miio import DeviceException
+
+_LOGGER = logging.getLogger(__name__)
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 2
+DEFAULT_BASE_BACKOFF = 30
+DEFAULT_MAX_BACKOFF = 900
+
+
+class DeviceUnavailable(DeviceException):
+    """The circuit of the device is open, no request was sent."""
+
+
+class CircuitBreaker:
+    """Track the transport failures of one device and stop calling it."""
+
+    def __init__(self, name: str,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 base_backoff: float = DEFAULT_BASE_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = HEALTHY
+        self.failures = 0
+        self.backoff = 0
+        self._retry_at = 0
+        self.opened = 0
+
+    @property
+    def retry_count(self) -> int:
+        """Retries of a request, none unless the device is healthy."""
+        return 3 if self.state == HEALTHY else 0
+
+    @property
+    def retry_in(self) -> float:
+        """Seconds until the next probe while the circuit is open."""
+        if self.state != OPEN:
+            return 0
+        return max(0, self._retry_at - time.monotonic())
+
+    def check(self) -> None:
+        """Raise DeviceUnavailable while the circuit is open.
+
+        Once the backoff has passed the circuit becomes half open and the
+        next request is let through as a probe.
+        """
+        if self.state != OPEN:
+            return
+        if time.monotonic() < self._retry_at:
+            raise DeviceUnavailable(
+                "%s is unavailable, next probe in %.0f seconds"
+                % (self.name, self.retry_in))
+        self.state = HALF_OPEN
+        _LOGGER.debug("Probing %s", self.name)
+
+    def record_success(self) -> None:
+        if self.state != HEALTHY:
+            _LOGGER.info("%s is responding again", self.name)
+        self.state = HEALTHY
+        self.failures = 0
+        self.backoff = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == OPEN:
+            return
+        if self.state == HALF_OPEN:
+            self._open(min(self.backoff * 2, self.max_backoff))
+        elif self.failures >= self.failure_threshold:
+            self._open(self.base_backoff)
+        else:
+            self.state = DEGRADED
+
+    def _open(self, backoff: float) -> None:
+        if self.state == HALF_OPEN:
+            _LOGGER.debug("Probe of %s failed, next probe in %.0f seconds",
+                          self.name, backoff)
+        else:
+            self.opened += 1
+            _LOGGER.warning("%s is not responding, next probe in %.0f seconds",
+                            self.name, backoff)
+        self.state = OPEN
+        self.backoff = backoff
+        self._retry_at = time.monotonic() + backoff
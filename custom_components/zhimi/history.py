@@ -0,0 +1,301 @@
+"""
+Columnar on-disk history of Zhimi Air Condition samples.
+
+Each device gets a directory with one append-only file per column. Rows are
+fixed width, so a column file is a plain little-endian array that is memory
+mapped for reads, and a time range is found by binary search on the
+timestamp column. Old raw samples are downsampled by rollup() into a
+coarser series next to the raw one.
+
+A row counts once all of its columns are written: the row count is the
+shortest column, the timestamp is written last and longer columns left by
+an interrupted append are truncated. rollup() writes the remaining raw rows
+to a new column directory and swaps it in as a whole.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_HISTORY = 'climate.zhimi.history'
+
+MODES = ['automode', 'cooling', 'heat', 'wind', 'arefaction']
+
+# name, dtype, value stored for a missing sample, scale of the stored value
+COLUMNS = (
+    ('ts', np.dtype('<u4'), 0, 1),
+    ('temperature', np.dtype('<i2'), -32768, 10),
+    ('target', np.dtype('<i2'), -32768, 10),
+    ('power', np.dtype('u1'), 255, 1),
+    ('mode', np.dtype('u1'), 255, 1),
+    ('fan_speed', np.dtype('i1'), -128, 1),
+    ('compressor_frq', np.dtype('<i2'), -32768, 1),
+)
+COLUMN_NAMES = [name for name, _, _, _ in COLUMNS]
+ROW_SIZE = sum(dtype.itemsize for _, dtype, _, _ in COLUMNS)
+
+# How the rollup aggregates a column within a bucket.
+ROLLUP_LAST = ('power', 'mode')
+
+COLUMN_DIR = 'columns'
+
+
+def _encode(value, missing, scale):
+    if value is None:
+        return missing
+    return int(round(value * scale))
+
+
+class DeviceHistory:
+    """Append-only columnar series of one device."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._columns = os.path.join(path, COLUMN_DIR)
+        self._pending = []
+        self._maps = {}
+        self._mapped_rows = -1
+        # Flushes, rollups and analytics run in different executor threads.
+        self._lock = threading.RLock()
+        with self._lock:
+            self._recover()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self._columns, name + '.col')
+
+    def __len__(self) -> int:
+        rows = []
+        for name, dtype, _, _ in COLUMNS:
+            try:
+                rows.append(os.path.getsize(self._file(name)) // dtype.itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(rows)
+
+    def _recover(self) -> None:
+        """Finish an interrupted rollup and drop partly appended rows."""
+        new = self._columns + '.new'
+        if os.path.isdir(new):
+            if os.path.isdir(self._columns):
+                # The new columns were not complete yet.
+                shutil.rmtree(new)
+            else:
+                # Interrupted between the two renames of the swap.
+                os.rename(new, self._columns)
+        shutil.rmtree(self._columns + '.old', ignore_errors=True)
+        os.makedirs(self._columns, exist_ok=True)
+        self._truncate(len(self))
+
+    def _truncate(self, rows: int) -> None:
+        for name, dtype, _, _ in COLUMNS:
+            column = self._file(name)
+            if (os.path.exists(column)
+                    and os.path.getsize(column) > rows * dtype.itemsize):
+                _LOGGER.warning("Dropping a partly written row from %s", column)
+                os.truncate(column, rows * dtype.itemsize)
+
+    def append(self, ts: int, temperature: float = None, target: float = None,
+               power: str = None, mode: str = None, fan_speed: int = None,
+               compressor_frq: int = None) -> None:
+        """Buffer a sample in memory until the next flush()."""
+        self._pending.append((
+            ts,
+            temperature,
+            target,
+            None if power is None else int(power == 'on'),
+            MODES.index(mode) if mode in MODES else None,
+            fan_speed,
+            compressor_frq,
+        ))
+
+    @property
+    def pending(self) -> int:
+        """Number of samples not written to disk yet."""
+        return len(self._pending)
+
+    def take_pending(self) -> list:
+        """Remove and return the buffered samples."""
+        rows, self._pending = self._pending, []
+        return rows
+
+    def flush(self) -> None:
+        """Write the buffered samples to the column files."""
+        self.write_rows(self.take_pending())
+
+    def write_rows(self, rows: list) -> None:
+        """Write samples taken with take_pending() to the column files."""
+        if not rows:
+            return
+        columns = {}
+        for index, (name, dtype, missing, scale) in enumerate(COLUMNS):
+            columns[name] = np.fromiter(
+                (_encode(row[index], missing, scale) for row in rows),
+                dtype=dtype, count=len(rows))
+        self.append_columns(columns)
+
+    def append_columns(self, columns: dict) -> None:
+        """Append already encoded column arrays of equal length."""
+        with self._lock:
+            # Leftovers of a failed append would misalign the new rows.
+            self._truncate(len(self))
+            last = self.last_ts()
+            ts = columns['ts']
+            if len(ts) and last is not None and ts[0] < last:
+                raise ValueError("Samples must be appended in time order")
+            for name, dtype, _, _ in COLUMNS[1:] + COLUMNS[:1]:
+                with open(self._file(name), 'ab') as column_file:
+                    column_file.write(
+                        np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+    def _column(self, name: str) -> np.ndarray:
+        with self._lock:
+            rows = len(self)
+            if rows != self._mapped_rows:
+                self._maps = {}
+                self._mapped_rows = rows
+            if name not in self._maps:
+                dtype = COLUMNS[COLUMN_NAMES.index(name)][1]
+                if rows == 0:
+                    self._maps[name] = np.empty(0, dtype=dtype)
+                else:
+                    self._maps[name] = np.memmap(
+                        self._file(name), dtype=dtype, mode='r', shape=(rows,))
+            return self._maps[name]
+
+    def last_ts(self):
+        """Timestamp of the newest sample on disk, None when empty."""
+        ts = self._column('ts')
+        return int(ts[-1]) if len(ts) else None
+
+    def read_raw(self, start: int, end: int) -> dict:
+        """Return the encoded columns of samples with start <= ts < end."""
+        with self._lock:
+            ts = self._column('ts')
+            first, last = np.searchsorted(ts, [start, end])
+            return {name: self._column(name)[first:last] for name in COLUMN_NAMES}
+
+    def read(self, start: int, end: int) -> dict:
+        """Return decoded arrays of samples with start <= ts < end.
+
+        Temperatures are float32 with NaN for missing samples, the other
+        columns keep their stored values and sentinels.
+        """
+        raw = self.read_raw(start, end)
+        result = {}
+        for name, dtype, missing, scale in COLUMNS:
+            column = raw[name]
+            if scale != 1:
+                decoded = column.astype(np.float32) / scale
+                decoded[column == missing] = np.nan
+                result[name] = decoded
+            else:
+                result[name] = np.array(column)
+        return result
+
+    def rollup(self, bucket: int, before: int) -> int:
+        """Downsample raw samples older than before into bucket seconds.
+
+        The aggregated rows are appended to the rollup series and the raw
+        files are rewritten without them. Buckets the rollup series already
+        has are not appended again, so an interrupted rollup can be repeated.
+        Buffered samples are not touched.
+        Returns the number of raw samples rolled up.
+        """
+        with self._lock:
+            return self._rollup(bucket, before)
+
+    def _rollup(self, bucket: int, before: int) -> int:
+        ts = self._column('ts')
+        before -= before % bucket
+        split = int(np.searchsorted(ts, before))
+        if split == 0:
+            return 0
+
+        old = {name: np.array(self._column(name)[:split]) for name in COLUMN_NAMES}
+        keys = old['ts'] // bucket
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], split] - 1
+
+        columns = {'ts': (keys[starts] * bucket).astype(COLUMNS[0][1])}
+        for name, dtype, missing, _ in COLUMNS[1:]:
+            values = old[name]
+            if name in ROLLUP_LAST:
+                columns[name] = values[ends]
+                continue
+            valid = values != missing
+            sums = np.add.reduceat(np.where(valid, values, 0).astype(np.int64), starts)
+            counts = np.add.reduceat(valid.astype(np.int64), starts)
+            means = np.full(len(starts), missing, dtype=dtype)
+            filled = counts > 0
+            means[filled] = np.round(sums[filled] / counts[filled])
+            columns[name] = means
+
+        series = self.rollup_series(bucket)
+        rolled_up = series.last_ts()
+        if rolled_up is not None:
+            # Buckets appended before an interrupted swap of the raw columns.
+            fresh = columns['ts'] > rolled_up
+            columns = {name: values[fresh] for name, values in columns.items()}
+        series.append_columns(columns)
+        self._replace_columns(
+            {name: self._column(name)[split:] for name in COLUMN_NAMES})
+
+        _LOGGER.debug("Rolled up %s samples of %s into %s buckets",
+                      split, self.path, len(starts))
+        return split
+
+    def _replace_columns(self, columns: dict) -> None:
+        """Swap in a new column directory holding columns."""
+        new = self._columns + '.new'
+        old = self._columns + '.old'
+        shutil.rmtree(new, ignore_errors=True)
+        os.makedirs(new)
+        for name, dtype, _, _ in COLUMNS:
+            with open(os.path.join(new, name + '.col'), 'wb') as column_file:
+                column_file.write(
+                    np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                column_file.flush()
+                os.fsync(column_file.fileno())
+        self._maps = {}
+        self._mapped_rows = -1
+        # _recover() completes the swap if it is interrupted in between.
+        os.rename(self._columns, old)
+        os.rename(new, self._columns)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def rollup_series(self, bucket: int) -> 'DeviceHistory':
+        """The downsampled series with the given bucket size."""
+        return DeviceHistory(os.path.join(self.path, 'rollup_%d' % bucket))
+
+
+class HistoryWriter:
+    """Write the buffered samples of a history in order, in the executor."""
+
+    def __init__(self, history: DeviceHistory) -> None:
+        self.history = history
+        self._lock = asyncio.Lock()
+
+    async def async_write(self, job=None):
+        """Write the buffered samples, then call job in the executor.
+
+        Writes run one after the other, so batches reach the disk in the
+        order they were buffered. A failed write is logged and its samples
+        are dropped. Returns the result of job.
+        """
+        async with self._lock:
+            rows = self.history.take_pending()
+            return await asyncio.get_event_loop().run_in_executor(
+                None, self._write, rows, job)
+
+    def _write(self, rows: list, job):
+        try:
+            self.history.write_rows(rows)
+        except (OSError, ValueError) as ex:
+            _LOGGER.error("Unable to write %s samples to %s: %s",
+                          len(rows), self.history.path, ex)
+        return job() if job is not None else None
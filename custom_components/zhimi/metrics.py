@@ -0,0 +1,201 @@
+"""
+Request metrics of Zhimi Air Conditions.
+
+Every device keeps latency histograms per miIO method, counters of timed out
+attempts, retries and failed calls, and histograms of its poll durations
+and of the intervals between its polls.
+PACKET_RATE in the transport counts the packets the whole fleet sends per
+second. render_prometheus() turns the metrics of a fleet into the
+Prometheus text exposition format.
+"""
+import bisect
+import time
+from collections import Counter, deque
+
+DATA_METRICS = 'climate.zhimi.metrics'
+
+# Upper bounds in seconds, the last bucket is +Inf.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+POLL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+INTERVAL_BUCKETS = (5, 10, 15, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    """Cumulative counts of observed values below fixed bucket bounds."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket holding the q-quantile, None when empty.
+
+        Values above the last bound are reported as the last bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def cumulative(self):
+        """(le, cumulative count) pairs including +Inf."""
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            yield bound, seen
+
+
+class DeviceMetrics:
+    """Request and poll metrics of one device."""
+
+    def __init__(self) -> None:
+        self.latency = {}
+        self.timeouts = Counter()
+        self.retries = Counter()
+        self.errors = Counter()
+        self.polls = Histogram(POLL_BUCKETS)
+        self.poll_failures = 0
+        self.last_poll_duration = None
+        self.poll_intervals = Histogram(INTERVAL_BUCKETS)
+        self.poll_interval = None
+
+    def observe_request(self, method: str, seconds: float) -> None:
+        """Record the duration of a successful call, retries included."""
+        if method not in self.latency:
+            self.latency[method] = Histogram()
+        self.latency[method].observe(seconds)
+
+    def observe_poll(self, seconds: float, success: bool) -> None:
+        self.polls.observe(seconds)
+        self.last_poll_duration = seconds
+        if not success:
+            self.poll_failures += 1
+
+    def observe_interval(self, seconds: float) -> None:
+        """Record the time between two scheduled polls."""
+        self.poll_intervals.observe(seconds)
+        self.poll_interval = seconds
+
+    def requests(self) -> Histogram:
+        """Latency histogram over all methods."""
+        total = Histogram()
+        for histogram in self.latency.values():
+            total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+            total.count += histogram.count
+            total.sum += histogram.sum
+        return total
+
+
+class PacketRate:
+    """Packets sent per second, kept for a sliding window of seconds."""
+
+    def __init__(self, window: int = 300) -> None:
+        self.window = window
+        self._seconds = deque()
+
+    def record(self, count: int = 1) -> None:
+        second = int(time.monotonic())
+        if self._seconds and self._seconds[-1][0] == second:
+            self._seconds[-1][1] += count
+        else:
+            self._seconds.append([second, count])
+            while self._seconds[0][0] <= second - self.window:
+                self._seconds.popleft()
+
+    @property
+    def peak(self) -> int:
+        """Most packets sent within one second of the window."""
+        oldest = int(time.monotonic()) - self.window
+        return max((count for second, count in self._seconds if second > oldest),
+                   default=0)
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(**labels) -> str:
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in labels.items())
+
+
+def _histogram_lines(name: str, histogram: Histogram, **labels) -> list:
+    lines = []
+    for bound, count in histogram.cumulative():
+        lines.append('%s_bucket{%s} %d' % (
+            name, _labels(**labels, le=_format_value(bound)), count))
+    lines.append('%s_sum{%s} %s' % (name, _labels(**labels), repr(histogram.sum)))
+    lines.append('%s_count{%s} %d' % (name, _labels(**labels), histogram.count))
+    return lines
+
+
+def render_prometheus(devices: dict, peak_packets: int = None) -> str:
+    """Prometheus text format of the metrics of devices, keyed by host."""
+    lines = [
+        '# HELP zhimi_request_duration_seconds Duration of miIO calls including retries.',
+        '# TYPE zhimi_request_duration_seconds histogram',
+    ]
+    for host, metrics in sorted(devices.items()):
+        for method, histogram in sorted(metrics.latency.items()):
+            lines.extend(_histogram_lines(
+                'zhimi_request_duration_seconds', histogram,
+                host=host, method=method))
+
+    for name, attribute, text in (
+            ('zhimi_request_timeouts_total', 'timeouts',
+             'miIO requests without a reply within the timeout.'),
+            ('zhimi_request_retries_total', 'retries',
+             'miIO requests sent again after a timeout.'),
+            ('zhimi_request_errors_total', 'errors',
+             'miIO calls which failed.')):
+        lines.append('# HELP %s %s' % (name, text))
+        lines.append('# TYPE %s counter' % name)
+        for host, metrics in sorted(devices.items()):
+            for method, count in sorted(getattr(metrics, attribute).items()):
+                lines.append('%s{%s} %d' % (
+                    name, _labels(host=host, method=method), count))
+
+    lines.append('# HELP zhimi_poll_duration_seconds Duration of status polls.')
+    lines.append('# TYPE zhimi_poll_duration_seconds histogram')
+    for host, metrics in sorted(devices.items()):
+        lines.extend(_histogram_lines(
+            'zhimi_poll_duration_seconds', metrics.polls, host=host))
+
+    lines.append('# HELP zhimi_poll_failures_total Status polls which failed.')
+    lines.append('# TYPE zhimi_poll_failures_total counter')
+    for host, metrics in sorted(devices.items()):
+        lines.append('zhimi_poll_failures_total{%s} %d' % (
+            _labels(host=host), metrics.poll_failures))
+
+    lines.append('# HELP zhimi_poll_interval_seconds Time between scheduled status polls.')
+    lines.append('# TYPE zhimi_poll_interval_seconds histogram')
+    for host, metrics in sorted(devices.items()):
+        lines.extend(_histogram_lines(
+            'zhimi_poll_interval_seconds', metrics.poll_intervals, host=host))
+
+    if peak_packets is not None:
+        lines.append('# HELP zhimi_peak_packets_per_second Most miIO packets sent within one second.')
+        lines.append('# TYPE zhimi_peak_packets_per_second gauge')
+        lines.append('zhimi_peak_packets_per_second %d' % peak_packets)
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,92 @@
+"""
+Poll schedule for a fleet of Zhimi Air Conditions.
+
+Every device is polled at its own offset within the poll interval, derived
+from a stable hash of its unique id. The offsets are spread evenly over the
+interval and survive restarts, so the fleet never sends its get_prop
+requests in the same second.
+
+The interval itself adapts to the activity of each device: an air condition
+which is off or holds its setpoint is polled slowly, one which was just
+commanded or whose temperature is moving is polled fast. After activity the
+interval doubles back step by step.
+"""
+import random
+import time
+import zlib
+
+# Seconds of random delay added to every poll.
+DEFAULT_POLL_JITTER = 0.5
+
+DEFAULT_MIN_POLL_INTERVAL = 10
+DEFAULT_MAX_POLL_INTERVAL = 300
+# Seconds a device is polled at the minimum interval after a command.
+DEFAULT_COMMAND_BOOST = 60
+# Degrees from the target temperature still counting as at the setpoint.
+DEFAULT_SETPOINT_BAND = 0.5
+
+
+def poll_phase(key: str, interval: float) -> float:
+    """Stable offset of a device within the poll interval, in seconds."""
+    return zlib.crc32(key.encode()) / 2 ** 32 * interval
+
+
+def next_poll_delay(now: float, phase: float, interval: float,
+                    jitter: float = DEFAULT_POLL_JITTER) -> float:
+    """Seconds from now (a wall clock time) until the next poll at phase."""
+    delay = (phase - now) % interval
+    return (delay or interval) + random.uniform(0, jitter)
+
+
+class AdaptiveInterval:
+    """Poll interval of one device, derived from its last status."""
+
+    def __init__(self, interval: float,
+                 min_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                 command_boost: float = DEFAULT_COMMAND_BOOST,
+                 setpoint_band: float = DEFAULT_SETPOINT_BAND) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.base_interval = min(max(interval, min_interval), self.max_interval)
+        self.command_boost = command_boost
+        self.setpoint_band = setpoint_band
+        self.interval = self.base_interval
+        self._temperature = None
+        self._boost_until = 0
+
+    def boost(self) -> None:
+        """Poll at the minimum interval for a while after a command."""
+        self._boost_until = time.monotonic() + self.command_boost
+        self.interval = self.min_interval
+
+    def update(self, status) -> float:
+        """Return the interval until the poll after status (None if failed).
+
+        Faster intervals apply at once, slower ones are approached by
+        doubling the current interval.
+        """
+        target = self._target(status)
+        if status is not None:
+            self._temperature = status.temperature
+        if target > self.interval:
+            self.interval = min(target, self.interval * 2)
+        else:
+            self.interval = target
+        return self.interval
+
+    def _target(self, status) -> float:
+        if time.monotonic() < self._boost_until:
+            return self.min_interval
+        if status is None:
+            # The circuit breaker of the device takes care of failures.
+            return self.base_interval
+        if status.power != 'on':
+            return self.max_interval
+        if (status.temperature is not None and status.target_temp is not None
+                and abs(status.temperature - status.target_temp) <= self.setpoint_band):
+            return self.max_interval
+        if (self._temperature is not None and status.temperature is not None
+                and status.temperature != self._temperature):
+            return self.min_interval
+        return self.base_interval
@@ -0,0 +1,351 @@
+"""
+Diagnostic, telemetry and daily analytics sensors of the Zhimi Air Condition ma1
+"""
+import logging
+import time
+from datetime import timedelta
+
+from homeassistant.const import (
+    CONF_HOST, CONF_NAME, ENERGY_KILO_WATT_HOUR, TEMP_CELSIUS, TIME_HOURS,
+    TIME_MILLISECONDS, TIME_MINUTES, TIME_SECONDS, UNIT_PERCENTAGE)
+from homeassistant.core import callback
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
+import homeassistant.util.dt as dt_util
+
+from .analytics import DATA_ANALYTICS
+from .history import DATA_HISTORY
+from .metrics import DATA_METRICS
+from .telemetry import DATA_TELEMETRY
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_SAMPLES = "samples"
+ATTR_MIN = "min"
+ATTR_MAX = "max"
+ATTR_MEAN = "mean"
+ATTR_YESTERDAY = "yesterday"
+ATTR_RETRIES = "retries"
+ATTR_POLLS = "polls"
+ATTR_POLL_FAILURES = "poll_failures"
+ATTR_CURRENT = "current"
+
+CONF_UNIQUE_ID = 'unique_id'
+
+ANALYTICS_INTERVAL = timedelta(minutes=15)
+
+TELEMETRY_SENSORS = {
+    'compressor_frq': ("Compressor Frequency", "Hz", "mdi:sine-wave"),
+    'motor_speed': ("Motor Speed", "rpm", "mdi:fan"),
+    'ot_run_temp': ("OT Run Temperature", TEMP_CELSIUS, "mdi:thermometer"),
+    'ep_temp': ("EP Temperature", TEMP_CELSIUS, "mdi:thermometer"),
+    'es_temp': ("ES Temperature", TEMP_CELSIUS, "mdi:thermometer"),
+    'he_temp': ("HE Temperature", TEMP_CELSIUS, "mdi:thermometer"),
+}
+
+# field: label, unit, icon, factor applied to the computed value, precision
+ANALYTICS_SENSORS = {
+    'runtime_hours': ("Runtime Today", TIME_HOURS, "mdi:timer-outline", 1, 2),
+    'compressor_duty_cycle': (
+        "Compressor Duty Cycle Today", UNIT_PERCENTAGE, "mdi:engine", 100, 1),
+    'energy_kwh': (
+        "Energy Today", ENERGY_KILO_WATT_HOUR, "mdi:flash", 1, 3),
+    'time_to_setpoint': (
+        "Time To Setpoint Today", TIME_MINUTES, "mdi:thermometer-check", 1 / 60, 1),
+}
+
+
+def _request_latency(metrics):
+    mean = metrics.requests().mean
+    return None if mean is None else round(mean * 1000, 1)
+
+
+def _request_latency_attributes(metrics):
+    return {
+        method: {
+            'count': histogram.count,
+            'mean_ms': round(histogram.mean * 1000, 1),
+            'p95_ms': histogram.quantile(0.95) * 1000,
+        }
+        for method, histogram in sorted(metrics.latency.items())
+    }
+
+
+# field: label, unit, icon, state of the metrics, attributes of the metrics
+METRIC_SENSORS = {
+    'poll_duration': (
+        "Poll Duration", TIME_SECONDS, "mdi:timer-sand",
+        lambda metrics: (None if metrics.last_poll_duration is None
+                         else round(metrics.last_poll_duration, 3)),
+        lambda metrics: {ATTR_POLLS: metrics.polls.count,
+                         ATTR_POLL_FAILURES: metrics.poll_failures}),
+    'poll_interval': (
+        "Poll Interval", TIME_SECONDS, "mdi:timer-sync-outline",
+        lambda metrics: (None if metrics.poll_intervals.mean is None
+                         else round(metrics.poll_intervals.mean, 1)),
+        lambda metrics: {ATTR_CURRENT: (None if metrics.poll_interval is None
+                                        else round(metrics.poll_interval, 1)),
+                         ATTR_POLLS: metrics.poll_intervals.count}),
+    'request_latency': (
+        "Request Latency", TIME_MILLISECONDS, "mdi:lan-pending",
+        _request_latency, _request_latency_attributes),
+    'timeouts': (
+        "Timeouts", None, "mdi:timer-alert-outline",
+        lambda metrics: sum(metrics.timeouts.values()),
+        lambda metrics: dict(metrics.timeouts, **{
+            ATTR_RETRIES: sum(metrics.retries.values())})),
+    'errors': (
+        "Errors", None, "mdi:alert-circle-outline",
+        lambda metrics: sum(metrics.errors.values()),
+        lambda metrics: dict(metrics.errors)),
+}
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the diagnostic, telemetry and analytics sensors of an air condition."""
+    if discovery_info is None:
+        return
+
+    host = discovery_info[CONF_HOST]
+    name = discovery_info[CONF_NAME]
+    unique_id = discovery_info[CONF_UNIQUE_ID]
+
+    async_add_entities([
+        ZhimiMetricSensor(hass.data[DATA_METRICS][host], name, unique_id, field)
+        for field in METRIC_SENSORS
+    ])
+
+    sampler = hass.data.get(DATA_TELEMETRY, {}).get(host)
+    if sampler is not None:
+        async_add_entities([
+            ZhimiTelemetrySensor(sampler, name, unique_id, field)
+            for field in TELEMETRY_SENSORS
+        ])
+
+    analytics = hass.data.get(DATA_ANALYTICS, {}).get(host)
+    if analytics is not None:
+        sensors = [
+            ZhimiAnalyticsSensor(name, unique_id, field)
+            for field in ANALYTICS_SENSORS
+        ]
+        async_add_entities(sensors)
+        async_setup_analytics(
+            hass, analytics, hass.data[DATA_HISTORY][host], sensors)
+
+
+@callback
+def async_setup_analytics(hass, analytics, writer, sensors):
+    """Recompute the daily statistics of a device periodically."""
+
+    def compute():
+        utc_offset = int(dt_util.now().utcoffset().total_seconds())
+        return analytics.compute(int(time.time()), utc_offset)
+
+    async def async_update_analytics(_now):
+        """Flush the buffered samples and aggregate in the executor."""
+        try:
+            result = await writer.async_write(compute)
+        except (OSError, ValueError) as ex:
+            _LOGGER.error("Unable to compute the analytics of %s: %s",
+                          analytics.history.path, ex)
+            return
+        for sensor in sensors:
+            sensor.async_set_days(result['today'], result['yesterday'])
+
+    hass.async_create_task(async_update_analytics(None))
+    async_track_time_interval(hass, async_update_analytics, ANALYTICS_INTERVAL)
+
+
+class ZhimiTelemetrySensor(Entity):
+    """A compressor or coil sensor of a Zhimi Air Condition."""
+
+    def __init__(self, sampler, name, unique_id, field):
+        """Initialize the sensor."""
+        self._sampler = sampler
+        self._field = field
+        label, self._unit, self._icon = TELEMETRY_SENSORS[field]
+        self._name = "{} {}".format(name, label)
+        self._unique_id = "{}-{}".format(unique_id, field)
+        self._unsub_sampler = None
+
+    async def async_added_to_hass(self):
+        """Subscribe to the telemetry, which starts the sampling."""
+        self._unsub_sampler = self._sampler.async_subscribe(
+            self.async_write_ha_state)
+
+    async def async_will_remove_from_hass(self):
+        """Unsubscribe, sampling stops with the last subscriber."""
+        if self._unsub_sampler is not None:
+            self._unsub_sampler()
+            self._unsub_sampler = None
+
+    @property
+    def should_poll(self):
+        """Return the polling state, the sampler pushes new values."""
+        return False
+
+    @property
+    def entity_registry_enabled_default(self):
+        """Telemetry is opt-in, the sensors have to be enabled."""
+        return False
+
+    @property
+    def unique_id(self):
+        """Return an unique ID."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def icon(self):
+        """Return the icon of the sensor."""
+        return self._icon
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return self._unit
+
+    @property
+    def available(self):
+        """Return true when a sample is known."""
+        return self._sampler.latest is not None
+
+    @property
+    def state(self):
+        """Return the latest sampled value."""
+        latest = self._sampler.latest
+        return latest.get(self._field) if latest else None
+
+    @property
+    def device_state_attributes(self):
+        """Return statistics over the buffered samples."""
+        values = [value for _, value in self._sampler.series(self._field)
+                  if isinstance(value, (int, float))]
+        if not values:
+            return {ATTR_SAMPLES: 0}
+        return {
+            ATTR_SAMPLES: len(values),
+            ATTR_MIN: min(values),
+            ATTR_MAX: max(values),
+            ATTR_MEAN: round(sum(values) / len(values), 1),
+        }
+
+
+class ZhimiAnalyticsSensor(Entity):
+    """A daily statistic computed from the history of a Zhimi Air Condition."""
+
+    def __init__(self, name, unique_id, field):
+        """Initialize the sensor."""
+        self._field = field
+        label, self._unit, self._icon, self._factor, self._precision = \
+            ANALYTICS_SENSORS[field]
+        self._name = "{} {}".format(name, label)
+        self._unique_id = "{}-{}".format(unique_id, field)
+        self._state = None
+        self._yesterday = None
+        self._computed = False
+
+    def _scale(self, value):
+        if value is None:
+            return None
+        return round(value * self._factor, self._precision)
+
+    @callback
+    def async_set_days(self, today, yesterday):
+        """Take the statistics of today and yesterday and write the state."""
+        self._state = self._scale(today[self._field])
+        self._yesterday = self._scale(yesterday[self._field])
+        self._computed = True
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    @property
+    def should_poll(self):
+        """Return the polling state, the statistics are pushed."""
+        return False
+
+    @property
+    def unique_id(self):
+        """Return an unique ID."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def icon(self):
+        """Return the icon of the sensor."""
+        return self._icon
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return self._unit
+
+    @property
+    def available(self):
+        """Return true once the statistics were computed."""
+        return self._computed
+
+    @property
+    def state(self):
+        """Return the value of today so far."""
+        return self._state
+
+    @property
+    def device_state_attributes(self):
+        """Return the value of yesterday."""
+        return {ATTR_YESTERDAY: self._yesterday}
+
+
+class ZhimiMetricSensor(Entity):
+    """A request or poll metric of a Zhimi Air Condition."""
+
+    def __init__(self, metrics, name, unique_id, field):
+        """Initialize the sensor."""
+        self._metrics = metrics
+        label, self._unit, self._icon, self._state_of, self._attributes_of = \
+            METRIC_SENSORS[field]
+        self._name = "{} {}".format(name, label)
+        self._unique_id = "{}-{}".format(unique_id, field)
+
+    @property
+    def entity_registry_enabled_default(self):
+        """Diagnostics are opt-in, the sensors have to be enabled."""
+        return False
+
+    @property
+    def unique_id(self):
+        """Return an unique ID."""
+        return self._unique_id
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def icon(self):
+        """Return the icon of the sensor."""
+        return self._icon
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return self._unit
+
+    @property
+    def state(self):
+        """Return the current value of the metric."""
+        return self._state_of(self._metrics)
+
+    @property
+    def device_state_attributes(self):
+        """Return the breakdown of the metric."""
+        return self._attributes_of(self._metrics)
@@ -0,0 +1,87 @@
+"""
+High resolution telemetry of the Zhimi Air Condition.
+
+Samples the compressor and coil sensors, which the climate poll does not
+read, into a fixed-size ring buffer per device. Sampling only runs while at
+least one consumer is subscribed.
+"""
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+from miio import DeviceException
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_TELEMETRY = 'climate.zhimi.telemetry'
+
+CONF_TELEMETRY = 'telemetry'
+CONF_TELEMETRY_INTERVAL = 'interval'
+CONF_TELEMETRY_BUFFER_SIZE = 'buffer_size'
+
+DEFAULT_TELEMETRY_INTERVAL = 10
+DEFAULT_TELEMETRY_BUFFER_SIZE = 360
+
+
+class TelemetrySampler:
+    """Sample the telemetry of one device while it has subscribers."""
+
+    def __init__(self, hass, device, interval: float = DEFAULT_TELEMETRY_INTERVAL,
+                 buffer_size: int = DEFAULT_TELEMETRY_BUFFER_SIZE) -> None:
+        self.hass = hass
+        self._device = device
+        self._interval = timedelta(seconds=interval)
+        self.samples = deque(maxlen=buffer_size)
+        self._listeners = []
+        self._unsub_sample = None
+        self._sampling = False
+
+    @property
+    def latest(self):
+        """Most recent sample as a dict, None before the first sample."""
+        return self.samples[-1][1] if self.samples else None
+
+    def series(self, field: str) -> list:
+        """Buffered (timestamp, value) pairs of a single field."""
+        return [(ts, values.get(field)) for ts, values in self.samples]
+
+    @callback
+    def async_subscribe(self, update_callback):
+        """Call update_callback after every sample until unsubscribed."""
+        self._listeners.append(update_callback)
+        if self._unsub_sample is None:
+            _LOGGER.debug("Starting telemetry of %s", self._device.ip)
+            self._unsub_sample = async_track_time_interval(
+                self.hass, self._async_sample, self._interval)
+            self.hass.async_create_task(self._async_sample(None))
+
+        @callback
+        def unsubscribe():
+            self._listeners.remove(update_callback)
+            if not self._listeners and self._unsub_sample is not None:
+                _LOGGER.debug("Stopping telemetry of %s", self._device.ip)
+                self._unsub_sample()
+                self._unsub_sample = None
+
+        return unsubscribe
+
+    async def _async_sample(self, _now) -> None:
+        if self._sampling:
+            return
+        self._sampling = True
+        try:
+            values = await self._device.async_telemetry()
+        except DeviceException as ex:
+            _LOGGER.debug("Sampling the telemetry of %s failed: %s",
+                          self._device.ip, ex)
+            return
+        finally:
+            self._sampling = False
+
+        self.samples.append((time.time(), values))
+        for update_callback in list(self._listeners):
+            update_callback()
@@ -0,0 +1,176 @@
+"""
+Lightweight tracing of Zhimi Air Condition polls.
+
+Spans time the phases of a poll (handshake, packet build and encryption,
+network wait, decryption and parsing, state write) and nest through a
+context variable, so the spans of one poll share a trace id even across
+pipelined requests. Finished spans are written as JSON lines to a rotating
+file by a background thread, in batches. While tracing is disabled span() returns a
+shared no-op context manager and nothing else is done.
+
+    {"trace": 7, "span": 9, "parent": 8, "name": "network", "ts": 1700000000.123,
+     "ms": 12.345, "host": "192.168.1.10", "method": "get_prop"}
+"""
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueListener, RotatingFileHandler
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = 'zhimi_trace.jsonl'
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+# Finished spans are handed to the writer thread at least every second or
+# once this many are buffered, which keeps the thread off the event loop.
+FLUSH_SPANS = 256
+FLUSH_INTERVAL = 1
+
+_CURRENT_SPAN = ContextVar('zhimi_span', default=None)
+_SPAN_IDS = itertools.count(1)
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _TraceWriter(QueueListener):
+    """Format and write the queued batches of spans in the background thread."""
+
+    def prepare(self, batch):
+        return logging.makeLogRecord({'msg': '\n'.join(
+            json.dumps(line, default=str) for line in batch)})
+
+
+class Span:
+    """A timed phase, written to the trace when it ends."""
+
+    __slots__ = ('tracer', 'name', 'attributes', 'span_id', 'trace_id',
+                 'parent_id', 'timestamp', '_start', '_token')
+
+    def __init__(self, tracer, name: str, attributes: dict) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_SPAN_IDS)
+
+    def __enter__(self):
+        parent = _CURRENT_SPAN.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self._token = _CURRENT_SPAN.set(self)
+        self.timestamp = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._start
+        _CURRENT_SPAN.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self.tracer.write(self.trace_id, self.span_id, self.parent_id,
+                          self.name, self.timestamp, duration, self.attributes)
+        return False
+
+    def set(self, **attributes) -> None:
+        """Add attributes known only while the span is running."""
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """Create spans and hand finished ones to the trace file writer."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.path = None
+        self._queue = None
+        self._listener = None
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._flushed = time.monotonic()
+
+    def start(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES,
+              backup_count: int = DEFAULT_BACKUP_COUNT) -> None:
+        """Start writing spans to path. Opens the file, call it in the executor."""
+        if self.enabled:
+            self.stop()
+        handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                      backupCount=backup_count)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._queue = queue.SimpleQueue()
+        self._listener = _TraceWriter(self._queue, handler)
+        self._listener.start()
+        self.path = path
+        self.enabled = True
+        _LOGGER.info("Tracing polls to %s", path)
+
+    def stop(self) -> None:
+        """Stop tracing and flush the spans written so far."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._flush()
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+        self._queue = None
+        _LOGGER.info("Stopped tracing polls to %s", self.path)
+
+    def span(self, name: str, **attributes):
+        """Context manager timing a phase, nested in the current span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def record(self, name: str, start: float, end: float, **attributes) -> None:
+        """Write a span of a phase timed elsewhere, perf_counter() values."""
+        if not self.enabled:
+            return
+        parent = _CURRENT_SPAN.get()
+        span_id = next(_SPAN_IDS)
+        self.write(parent.trace_id if parent is not None else span_id, span_id,
+                   parent.span_id if parent is not None else None, name,
+                   time.time() - (time.perf_counter() - start), end - start,
+                   attributes)
+
+    def write(self, trace_id: int, span_id: int, parent_id, name: str,
+              timestamp: float, duration: float, attributes: dict) -> None:
+        line = dict(trace=trace_id, span=span_id, parent=parent_id, name=name,
+                    ts=round(timestamp, 6), ms=round(duration * 1000, 3),
+                    **attributes)
+        with self._lock:
+            self._buffer.append(line)
+            if (len(self._buffer) < FLUSH_SPANS
+                    and time.monotonic() - self._flushed < FLUSH_INTERVAL):
+                return
+        self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._flushed = time.monotonic()
+        trace_queue = self._queue
+        if batch and trace_queue is not None:
+            trace_queue.put(batch)
+
+
+TRACER = Tracer()
@@ -0,0 +1,342 @@
+"""
+Asyncio miIO transport for the Zhimi Air Condition.
+
+Speaks the miIO UDP protocol (handshake, AES encrypted payloads, request id
+matching) on the event loop, so that no executor thread is held while waiting
+for the device to answer. Several requests can be pipelined, see send_many().
+Packets are built and parsed by the codec of the token, see codec.py.
+"""
+import asyncio
+import logging
+import struct
+import time
+
+from miio import DeviceException
+from miio.exceptions import DeviceError
+
+from .codec import MiIOCodec, codec_for
+from .metrics import DeviceMetrics, PacketRate
+from .tracing import TRACER
+
+_LOGGER = logging.getLogger(__name__)
+
+MIIO_PORT = 54321
+HELLO = bytes.fromhex(
+    "21310020ffffffffffffffffffffffffffffffffffffffffffffffffffffffff")
+HEADER = struct.Struct(">HHIII")
+
+# Seconds the stamp of a reply may deviate from the expected device clock
+# before the session is considered stale and a new handshake is made.
+MAX_CLOCK_DRIFT = 30
+# Consecutive timeouts after which the session is dropped.
+MAX_TIMEOUTS = 2
+# Requests outstanding at the same time in send_many().
+DEFAULT_PIPELINE_WINDOW = 4
+
+
+class MiIOSession:
+    """Handshake state of a device: device id and device clock offset.
+
+    Sessions are shared by all transports talking to the same device with the
+    same token, so recreating an AirCondition does not cost a handshake.
+    """
+
+    def __init__(self) -> None:
+        self.device_id = None
+        self._stamp = None
+        self._anchor = None
+        self._timeouts = 0
+        self.handshakes = 0
+        self._since = time.monotonic()
+
+    @property
+    def established(self) -> bool:
+        return self.device_id is not None
+
+    def establish(self, device_id: bytes, stamp: int) -> None:
+        """Store the result of a handshake."""
+        self.device_id = device_id
+        self._stamp = stamp
+        self._anchor = time.monotonic()
+        self._timeouts = 0
+        self.handshakes += 1
+
+    def stamp(self) -> int:
+        """Current device clock, derived from the last synchronization."""
+        return self._stamp + int(time.monotonic() - self._anchor) + 1
+
+    def synchronize(self, stamp: int) -> None:
+        """Re-anchor the device clock with the stamp of a reply."""
+        drift = stamp - self.stamp()
+        self._timeouts = 0
+        if abs(drift) > MAX_CLOCK_DRIFT:
+            _LOGGER.debug("Device clock drifted by %s seconds, "
+                          "dropping the session", drift)
+            self.invalidate()
+            return
+        self._stamp = stamp
+        self._anchor = time.monotonic()
+
+    def timed_out(self) -> None:
+        """Drop the session after repeated timeouts."""
+        self._timeouts += 1
+        if self._timeouts >= MAX_TIMEOUTS:
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        self.device_id = None
+        self._timeouts = 0
+
+    @property
+    def handshakes_per_hour(self) -> float:
+        hours = (time.monotonic() - self._since) / 3600
+        return round(self.handshakes / hours, 1) if hours > 0 else 0.0
+
+
+_SESSIONS = {}
+
+# Packets sent per second by all transports.
+PACKET_RATE = PacketRate()
+
+
+class MiIODatagramProtocol(asyncio.DatagramProtocol):
+    """Datagram endpoint dispatching device replies to waiting requests."""
+
+    def __init__(self, codec: MiIOCodec) -> None:
+        self._codec = codec
+        self._transport = None
+        self._hello = None
+        self._pending = {}
+        # perf_counter() of receiving and of having parsed the replies, by
+        # message id, kept while tracing only.
+        self.timings = {}
+
+    def connection_made(self, transport) -> None:
+        self._transport = transport
+
+    def connection_lost(self, exc) -> None:
+        self._transport = None
+        self._fail_all(exc or DeviceException("Connection closed"))
+
+    def error_received(self, exc) -> None:
+        self._fail_all(DeviceException("Socket error: %s" % exc))
+
+    def datagram_received(self, data, addr) -> None:
+        if len(data) == HEADER.size + 16:
+            if self._hello is not None and not self._hello.done():
+                self._hello.set_result(HEADER.unpack_from(data))
+            return
+
+        received = time.perf_counter() if TRACER.enabled else None
+        try:
+            _, stamp, payload = self._codec.decode(data)
+        except Exception as ex:
+            _LOGGER.debug("Unable to parse reply from %s: %s", addr, ex)
+            return
+
+        if not isinstance(payload, dict) or "id" not in payload:
+            _LOGGER.debug("Ignoring unexpected reply from %s: %s", addr, payload)
+            return
+
+        future = self._pending.pop(payload["id"], None)
+        if future is None or future.done():
+            _LOGGER.debug("Ignoring late reply with id %s", payload["id"])
+            return
+        if received is not None:
+            self.timings[payload["id"]] = (received, time.perf_counter())
+        future.set_result((stamp, payload))
+
+    def _fail_all(self, exc) -> None:
+        futures = list(self._pending.values())
+        if self._hello is not None:
+            futures.append(self._hello)
+        self._pending.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(exc)
+
+    @property
+    def closed(self) -> bool:
+        return self._transport is None or self._transport.is_closing()
+
+    def hello(self, loop) -> asyncio.Future:
+        """Send a hello packet and return a future for the reply header."""
+        if self._hello is None or self._hello.done():
+            self._hello = loop.create_future()
+        self._transport.sendto(HELLO)
+        PACKET_RATE.record()
+        return self._hello
+
+    def request(self, loop, request_id: int, packet: bytes) -> asyncio.Future:
+        """Send an encrypted request and return a future for the reply."""
+        future = loop.create_future()
+        self._pending[request_id] = future
+        self._transport.sendto(packet)
+        PACKET_RATE.record()
+        return future
+
+    def cancel(self, request_id: int) -> None:
+        self._pending.pop(request_id, None)
+        self.timings.pop(request_id, None)
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+
+
+class AsyncMiIOTransport:
+    """miIO client for a single device running on the asyncio event loop."""
+
+    def __init__(self, ip: str, token: str, start_id: int = 0,
+                 timeout: float = 5, metrics: DeviceMetrics = None) -> None:
+        self.ip = ip
+        self.token = bytes.fromhex(token)
+        self._codec = codec_for(self.token)
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else DeviceMetrics()
+        self._id = start_id
+        self._protocol = None
+        self.session = _SESSIONS.setdefault((ip, token), MiIOSession())
+        self._lock = asyncio.Lock()
+
+    async def _endpoint(self) -> MiIODatagramProtocol:
+        if self._protocol is None or self._protocol.closed:
+            loop = asyncio.get_event_loop()
+            _, self._protocol = await loop.create_datagram_endpoint(
+                lambda: MiIODatagramProtocol(self._codec),
+                remote_addr=(self.ip, MIIO_PORT))
+        return self._protocol
+
+    async def handshake(self) -> None:
+        """Learn the device id and timestamp required to address the device."""
+        protocol = await self._endpoint()
+        loop = asyncio.get_event_loop()
+        try:
+            with TRACER.span('handshake', host=self.ip):
+                header = await asyncio.wait_for(
+                    protocol.hello(loop), self.timeout)
+        except asyncio.TimeoutError:
+            raise DeviceException("Unable to discover the device %s" % self.ip)
+
+        _, _, _, device_id, ts = header
+        self.session.establish(device_id.to_bytes(4, "big"), ts)
+        _LOGGER.debug("Handshake with %s: device id %s, stamp %s",
+                      self.ip, device_id, ts)
+
+    def _build(self, request_id: int, command: str, parameters) -> bytes:
+        request = {"id": request_id, "method": command, "params": parameters}
+        _LOGGER.debug("%s:%s >>: %s", self.ip, MIIO_PORT, request)
+        return self._codec.encode(
+            request, self.session.device_id, self.session.stamp())
+
+    async def _exchange(self, protocol, command: str, parameters):
+        """Send one request, return the reply stamp and payload or Nones."""
+        self._id += 1
+        request_id = self._id
+        with TRACER.span('build', host=self.ip, method=command):
+            packet = self._build(request_id, command, parameters)
+        loop = asyncio.get_event_loop()
+        sent = time.perf_counter()
+        try:
+            reply = await asyncio.wait_for(
+                protocol.request(loop, request_id, packet), self.timeout)
+        except asyncio.TimeoutError:
+            TRACER.record('network', sent, time.perf_counter(), host=self.ip,
+                          method=command, timeout=True)
+            return None, None
+        else:
+            timing = protocol.timings.pop(request_id, None)
+            if timing is not None:
+                received, parsed = timing
+                TRACER.record('network', sent, received, host=self.ip,
+                              method=command)
+                TRACER.record('decrypt', received, parsed, host=self.ip,
+                              method=command)
+            return reply
+        finally:
+            protocol.cancel(request_id)
+
+    def _result(self, stamp: int, payload):
+        self.session.synchronize(stamp)
+        _LOGGER.debug("%s:%s <<: %s", self.ip, MIIO_PORT, payload)
+        if "error" in payload:
+            raise DeviceError(payload["error"])
+        return payload.get("result")
+
+    async def send(self, command: str, parameters=None, retry_count: int = 3):
+        """Send a command and return the result of the reply."""
+        if parameters is None:
+            parameters = []
+
+        async with self._lock:
+            if not self.session.established:
+                await self.handshake()
+            protocol = await self._endpoint()
+            stamp, payload = await self._exchange(
+                protocol, command, parameters)
+
+        if payload is None:
+            self.metrics.timeouts[command] += 1
+            if retry_count > 0:
+                self.metrics.retries[command] += 1
+                _LOGGER.debug("Retrying %s to %s, %s retries left",
+                              command, self.ip, retry_count)
+                self._id += 100
+                self.session.timed_out()
+                return await self.send(command, parameters, retry_count - 1)
+            self.session.timed_out()
+            raise DeviceException("No response from the device %s" % self.ip)
+
+        return self._result(stamp, payload)
+
+    async def send_many(self, requests: list, window: int = DEFAULT_PIPELINE_WINDOW,
+                        retry_count: int = 3) -> list:
+        """Send (command, parameters) requests pipelined.
+
+        Up to window requests are outstanding at the same time, replies are
+        matched by their message id. A request without a reply within the
+        timeout is sent again on its own with a new id, the others are not
+        affected. Returns the results in the order of requests; a request
+        failing with a DeviceError or exhausting its retries has the
+        exception in place of the result. The latency of every successful
+        request, from its first transmission to its reply, is recorded in
+        the metrics.
+        """
+        semaphore = asyncio.Semaphore(max(window, 1))
+
+        async def pipelined(protocol, command, parameters):
+            start = None
+            for retries_left in range(retry_count, -1, -1):
+                async with semaphore:
+                    if not self.session.established:
+                        await self.handshake()
+                    if start is None:
+                        start = time.monotonic()
+                    stamp, payload = await self._exchange(
+                        protocol, command, parameters or [])
+                if payload is not None:
+                    result = self._result(stamp, payload)
+                    self.metrics.observe_request(command, time.monotonic() - start)
+                    return result
+                self.metrics.timeouts[command] += 1
+                self.session.timed_out()
+                if retries_left:
+                    self.metrics.retries[command] += 1
+                    _LOGGER.debug("Retransmitting %s to %s, %s retries left",
+                                  command, self.ip, retries_left)
+            raise DeviceException("No response from the device %s" % self.ip)
+
+        async with self._lock:
+            if not self.session.established:
+                await self.handshake()
+            protocol = await self._endpoint()
+            return await asyncio.gather(
+                *(pipelined(protocol, command, parameters)
+                  for command, parameters in requests),
+                return_exceptions=True)
+
+    def close(self) -> None:
+        """Close the socket of this device."""
+        if self._protocol is not None:
+            self._protocol.close()
+            self._protocol = None
@@ -0,0 +1,30 @@
+"""Fixtures shared by the tests."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from simulator import start_fleet, stop_fleet  # noqa: E402
+
+
+@pytest.fixture
+def run_fleet():
+    """Run test(fleet) with simulated units on loopback addresses (Linux)."""
+
+    def run(test, units=1, **options):
+        async def main():
+            try:
+                fleet = await start_fleet(units, **options)
+            except OSError as ex:
+                pytest.skip("Unable to bind the simulated units: %s" % ex)
+            try:
+                return await test(fleet)
+            finally:
+                await stop_fleet(fleet)
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,58 @@
+"""MiIOCodec against the packets of miio.protocol.Message."""
+import calendar
+import datetime
+
+import pytest
+from miio.protocol import Message
+
+from custom_components.zhimi.codec import MiIOCodec
+
+TOKEN = bytes.fromhex('00112233445566778899aabbccddeeff')
+DEVICE_ID = bytes.fromhex('0102abcd')
+STAMP = 1600000000
+PAYLOAD = {'id': 42, 'method': 'get_prop', 'params': ['power', 'mode', 'st_temp_dec']}
+
+
+def build(payload, stamp=STAMP):
+    header = {'length': 0, 'unknown': 0, 'device_id': DEVICE_ID,
+              'ts': datetime.datetime.utcfromtimestamp(stamp)}
+    return Message.build(
+        {'data': {'value': payload}, 'header': {'value': header}, 'checksum': 0},
+        token=TOKEN)
+
+
+def test_encode_builds_the_packet_of_message():
+    data = MiIOCodec(TOKEN).encode(PAYLOAD, DEVICE_ID, STAMP)
+    assert data == build(PAYLOAD)
+
+    message = Message.parse(data, token=TOKEN)
+    header = message.header.value
+    assert header.device_id == DEVICE_ID
+    assert calendar.timegm(header.ts.utctimetuple()) == STAMP
+    assert message.data.value == PAYLOAD
+
+
+@pytest.mark.parametrize('result', [
+    ['ok'], [], ['on', 'cool', 260, None], ['x' * 1000]])
+def test_decode_parses_the_packet_of_message(result):
+    payload = {'id': 7, 'result': result}
+    assert MiIOCodec(TOKEN).decode(build(payload)) == (DEVICE_ID, STAMP, payload)
+
+
+def test_reused_buffer_does_not_leak_into_shorter_packets():
+    codec = MiIOCodec(TOKEN)
+    codec.encode({'id': 1, 'params': ['x' * 2000]}, DEVICE_ID, STAMP)
+    assert codec.encode(PAYLOAD, DEVICE_ID, STAMP) == build(PAYLOAD)
+
+
+def test_decode_rejects_corrupt_packets():
+    codec = MiIOCodec(TOKEN)
+    data = build(PAYLOAD)
+    with pytest.raises(ValueError, match='length'):
+        codec.decode(data[:-1])
+    with pytest.raises(ValueError, match='header'):
+        codec.decode(data[:2] + b'\xff\xff' + data[4:])
+    with pytest.raises(ValueError, match='Checksum'):
+        codec.decode(data[:-1] + bytes([data[-1] ^ 1]))
+    with pytest.raises(ValueError, match='Checksum'):
+        MiIOCodec(bytes(16)).decode(data)
@@ -0,0 +1,76 @@
+"""Coalescing and suppression of air condition commands."""
+import asyncio
+import time
+
+from custom_components.zhimi.airconditioning import AirCondition
+
+TOKEN = 'ffffffffffffffffffffffffffffffff'
+
+
+def make_device(window=0.05):
+    device = AirCondition('127.0.0.1', TOKEN, command_window=window)
+    device.sent = []
+
+    async def async_send(command, parameters=None, retry_count=3):
+        device.sent.append((command, parameters))
+        device._command_sent(command, parameters, ['ok'])
+        return ['ok']
+
+    device.async_send = async_send
+    return device
+
+
+def test_last_value_within_the_window_wins():
+    device = make_device()
+    device._command_sent('set_temperature', [250], ['ok'])
+
+    async def run():
+        return await asyncio.gather(
+            device.async_command('set_temperature', [260]),
+            device.async_command('set_temperature', [250]))
+
+    assert asyncio.run(run()) == [['ok'], ['ok']]
+    # Back at the cached value, nothing needs to be sent.
+    assert device.sent == []
+    assert device.commands_suppressed == 1
+    device.close()
+
+
+def test_changed_value_is_sent_once():
+    device = make_device()
+    device._command_sent('set_temperature', [250], ['ok'])
+
+    async def run():
+        await asyncio.gather(
+            device.async_command('set_temperature', [250]),
+            device.async_command('set_temperature', [270]))
+
+    asyncio.run(run())
+    assert device.sent == [('set_temperature', [270])]
+    assert device._queue.coalesced == 1
+    device.close()
+
+
+def test_current_value_is_suppressed_without_window():
+    device = make_device(window=0)
+    device._command_sent('set_power', ['on'], ['ok'])
+
+    assert asyncio.run(device.async_command('set_power', ['on'])) == ['ok']
+    assert asyncio.run(device.async_command('set_power', ['off'])) == ['ok']
+    assert device.sent == [('set_power', ['off'])]
+    device.close()
+
+
+def test_expired_commands_are_read_back_but_still_trusted():
+    device = make_device(window=0)
+    for prop in list(device._ttl):
+        device._cache[prop] = None
+        device._fetched_at[prop] = time.monotonic()
+    asyncio.run(device.async_command('set_power', ['on']))
+    due = set(device._expired_properties())
+    assert 'power' not in due
+
+    device.expire_unverified()
+    assert set(device._expired_properties()) - due == {'power'}
+    assert device.plan_state({'power': 'on'}) == []
+    device.close()
@@ -0,0 +1,106 @@
+"""Poll scheduling of the fleet coordinator."""
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.zhimi import coordinator  # noqa: E402
+from custom_components.zhimi.metrics import DeviceMetrics  # noqa: E402
+
+HOST = '192.168.1.10'
+POLL_SECONDS = 0.05
+
+
+class FakeDevice:
+    """An air condition whose status takes a while to arrive."""
+
+    def __init__(self) -> None:
+        self.metrics = DeviceMetrics()
+        self.polls = 0
+        self.running = 0
+        self.overlapping = 0
+
+    async def async_status(self):
+        self.polls += 1
+        self.running += 1
+        self.overlapping = max(self.overlapping, self.running)
+        try:
+            await asyncio.sleep(POLL_SECONDS)
+        finally:
+            self.running -= 1
+        return None
+
+    def expire_unverified(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def timers(monkeypatch):
+    """Run async_call_later on the loop, without jitter, and track the timers."""
+    pending = set()
+
+    def call_later(hass, delay, action):
+        def run():
+            pending.discard(handle)
+            hass.loop.create_task(action(None))
+
+        handle = hass.loop.call_later(delay, run)
+        pending.add(handle)
+
+        def unsub():
+            pending.discard(handle)
+            handle.cancel()
+
+        return unsub
+
+    monkeypatch.setattr(coordinator, 'async_call_later', call_later)
+    monkeypatch.setattr(coordinator, 'next_poll_delay',
+                        lambda now, phase, interval: interval)
+    return pending
+
+
+async def run_fleet(commands_during_poll):
+    hass = SimpleNamespace(loop=asyncio.get_running_loop())
+    fleet = coordinator.ZhimiUpdateCoordinator(hass, timedelta(seconds=0.2))
+    device = FakeDevice()
+    fleet.async_add_device(HOST, device, min_poll_interval=0.1,
+                           max_poll_interval=0.2)
+    while not device.running:
+        await asyncio.sleep(0.01)
+    for _ in range(commands_during_poll):
+        fleet.async_command_sent(HOST)
+    await asyncio.sleep(1)
+    fleet.async_stop()
+    return device
+
+
+def test_command_during_poll_keeps_a_single_poll_chain(timers):
+    device = asyncio.run(run_fleet(commands_during_poll=3))
+
+    assert device.overlapping == 1
+    # One poll, then at most one per boosted interval plus poll time.
+    assert device.polls <= 1 + 1 / (0.1 + POLL_SECONDS) + 1
+    assert not timers
+
+
+def test_command_while_idle_replaces_the_timer(timers):
+    async def run():
+        hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        fleet = coordinator.ZhimiUpdateCoordinator(hass, timedelta(seconds=0.2))
+        device = FakeDevice()
+        fleet.async_add_device(HOST, device, min_poll_interval=0.1)
+        for _ in range(3):
+            fleet.async_command_sent(HOST)
+        assert len(timers) == 1
+        await asyncio.sleep(0.15)
+        assert device.polls == 1
+        fleet.async_stop()
+
+    asyncio.run(run())
+    assert not timers
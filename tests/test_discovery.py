@@ -0,0 +1,21 @@
+"""Identification of discovered devices."""
+import asyncio
+import time
+
+from custom_components.zhimi.discovery import async_identify
+
+
+def test_invalid_token_is_recorded_per_device():
+    found = [
+        {'host': '127.0.0.9', 'device_id': 9, 'stamp': 0, 'token': None,
+         'received': time.monotonic()},
+        {'host': '127.0.0.8', 'device_id': 8, 'stamp': 0, 'token': None,
+         'received': time.monotonic()},
+    ]
+    known = [{'host': '127.0.0.9', 'token': 'not a hex token', 'name': 'Bad'}]
+
+    devices = asyncio.run(async_identify(found, known, timeout=0.1))
+
+    assert devices[0]['model'] is None
+    assert 'hexadecimal' in devices[0]['error']
+    assert devices[1]['model'] is None and 'error' not in devices[1]
@@ -0,0 +1,75 @@
+"""State transitions of the circuit breaker."""
+import pytest
+
+from custom_components.zhimi import health
+from custom_components.zhimi.health import (
+    DEGRADED, HALF_OPEN, HEALTHY, OPEN, CircuitBreaker, DeviceUnavailable)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(health.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_failures_open_the_circuit(clock):
+    breaker = CircuitBreaker('ac', failure_threshold=2, base_backoff=30)
+    assert breaker.retry_count == 3
+
+    breaker.record_failure()
+    assert breaker.state == DEGRADED
+    assert breaker.retry_count == 0
+    breaker.check()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 1
+    assert breaker.retry_in == 30
+    with pytest.raises(DeviceUnavailable):
+        breaker.check()
+
+    clock[0] += 10
+    assert breaker.retry_in == 20
+    with pytest.raises(DeviceUnavailable):
+        breaker.check()
+
+
+def test_success_closes_a_degraded_circuit(clock):
+    breaker = CircuitBreaker('ac', failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == HEALTHY
+    breaker.record_failure()
+    assert breaker.state == DEGRADED
+
+
+def test_failed_probes_double_the_backoff_up_to_the_maximum(clock):
+    breaker = CircuitBreaker('ac', failure_threshold=1, base_backoff=30,
+                             max_backoff=100)
+    breaker.record_failure()
+    for backoff in (60, 100, 100):
+        clock[0] += breaker.retry_in
+        breaker.check()
+        assert breaker.state == HALF_OPEN
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.backoff == backoff
+        assert breaker.retry_in == backoff
+    assert breaker.opened == 1
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker('ac', failure_threshold=1, base_backoff=30)
+    breaker.record_failure()
+    clock[0] += 30
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == HEALTHY
+    assert breaker.failures == 0
+    assert breaker.retry_count == 3
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.backoff == 30
+    assert breaker.opened == 2
@@ -0,0 +1,106 @@
+"""Crash consistency of the columnar history."""
+import asyncio
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from custom_components.zhimi.history import (
+    COLUMN_NAMES,
+    DeviceHistory,
+    HistoryWriter,
+)
+
+
+def fill(history, start, count):
+    for ts in range(start, start + count):
+        history.append(ts, 25.5, 26, 'on', 'cooling', 2, 40)
+    history.flush()
+
+
+def test_partly_appended_row_is_dropped(tmp_path):
+    history = DeviceHistory(str(tmp_path))
+    fill(history, 1000, 10)
+    # An append interrupted after the first columns.
+    for name in COLUMN_NAMES[1:4]:
+        with open(history._file(name), 'ab') as column_file:
+            column_file.write(b'\x01\x00')
+
+    assert len(history) == 10
+    reopened = DeviceHistory(str(tmp_path))
+    assert len(reopened) == 10
+    fill(reopened, 1010, 5)
+    data = reopened.read(0, 2000)
+    assert list(data['ts']) == list(range(1000, 1015))
+    assert np.all(data['temperature'] == np.float32(25.5))
+
+
+def test_rollup_swaps_the_columns(tmp_path):
+    history = DeviceHistory(str(tmp_path))
+    fill(history, 0, 600)
+
+    assert history.rollup(60, 300) == 300
+    assert list(history.read(0, 1000)['ts']) == list(range(300, 600))
+    rollup = history.rollup_series(60).read(0, 1000)
+    assert list(rollup['ts']) == [0, 60, 120, 180, 240]
+    assert sorted(os.listdir(str(tmp_path))) == ['columns', 'rollup_60']
+
+
+def test_interrupted_swap_is_completed(tmp_path):
+    history = DeviceHistory(str(tmp_path))
+    fill(history, 0, 100)
+    columns = os.path.join(str(tmp_path), 'columns')
+    os.rename(columns, columns + '.new')
+
+    assert len(DeviceHistory(str(tmp_path))) == 100
+    assert not os.path.exists(columns + '.new')
+
+
+def test_rollup_after_an_interrupted_swap(tmp_path, monkeypatch):
+    history = DeviceHistory(str(tmp_path))
+    fill(history, 0, 600)
+
+    def crash(columns):
+        raise OSError("crashed")
+
+    monkeypatch.setattr(history, '_replace_columns', crash)
+    with pytest.raises(OSError):
+        history.rollup(60, 300)
+    monkeypatch.undo()
+
+    assert history.rollup(60, 300) == 300
+    assert list(history.read(0, 1000)['ts']) == list(range(300, 600))
+    rollup = history.rollup_series(60).read(0, 1000)
+    assert list(rollup['ts']) == [0, 60, 120, 180, 240]
+    assert history.rollup(60, 420) == 120
+    assert list(history.rollup_series(60).read(0, 1000)['ts']) == [
+        0, 60, 120, 180, 240, 300, 360]
+
+
+def test_writer_keeps_the_order_of_batches(tmp_path):
+    history = DeviceHistory(str(tmp_path))
+
+    async def run():
+        writer = HistoryWriter(history)
+        writes = []
+        for start in range(0, 1000, 10):
+            for ts in range(start, start + 10):
+                history.append(ts, 25, 26, 'on', 'cooling', 2)
+            writes.append(asyncio.ensure_future(writer.async_write()))
+        await asyncio.gather(*writes)
+        return await writer.async_write(history.__len__)
+
+    assert asyncio.run(run()) == 1000
+    assert list(history.read(0, 2000)['ts']) == list(range(1000))
+
+
+def test_writer_logs_a_failed_write(tmp_path, caplog):
+    history = DeviceHistory(str(tmp_path))
+    fill(history, 100, 5)
+    history.append(50, 25, 26, 'on', 'cooling', 2)
+
+    with caplog.at_level(logging.ERROR):
+        assert asyncio.run(HistoryWriter(history).async_write()) is None
+    assert "Unable to write 1 samples" in caplog.text
+    assert len(history) == 5 and history.pending == 0
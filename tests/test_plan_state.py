@@ -0,0 +1,69 @@
+"""Command plans of AirCondition.apply()."""
+import pytest
+
+from custom_components.zhimi.airconditioning import (
+    AirCondition,
+    AirConditionException,
+)
+
+TOKEN = 'ffffffffffffffffffffffffffffffff'
+
+
+@pytest.fixture
+def device():
+    device = AirCondition('127.0.0.1', TOKEN)
+    yield device
+    device.close()
+
+
+def test_power_on_first_and_preset_last(device):
+    plan = device.plan_state({
+        'sleep': 'on', 'swing': 'on', 'fan_speed': 2, 'power': 'on',
+        'target_temp': 25, 'mode': 'cooling'})
+
+    assert plan == [
+        ('set_power', ['on']),
+        ('set_mode', ['cooling']),
+        ('set_temperature', [250]),
+        ('set_spd_level', [2]),
+        ('set_vertical', ['on']),
+        ('set_silent', ['on']),
+    ]
+
+
+def test_preset_off_first_and_power_off_last(device):
+    plan = device.plan_state({'power': 'off', 'mode': 'heat', 'comfort': 'off'})
+
+    assert plan == [
+        ('set_comfort', ['off']),
+        ('set_mode', ['heat']),
+        ('set_power', ['off']),
+    ]
+
+
+def test_switching_presets_sends_only_the_new_one(device):
+    device._command_sent('set_silent', ['on'], ['ok'])
+
+    assert device.plan_state({'sleep': 'off', 'comfort': 'on'}) == [
+        ('set_comfort', ['on'])]
+
+
+def test_current_settings_are_skipped(device):
+    device._command_sent('set_power', ['on'], ['ok'])
+    device._command_sent('set_mode', ['cooling'], ['ok'])
+
+    assert device.plan_state(
+        {'power': 'on', 'mode': 'cooling', 'target_temp': 26}) == [
+            ('set_temperature', [260])]
+
+
+@pytest.mark.parametrize('desired', [
+    {'comfort': 'on', 'sleep': 'on'},
+    {'comfort': 'on', 'target_temp': 26},
+    {'comfort': 'on', 'mode': 'cooling', 'fan_speed': 5},
+    {'fan_speed': 6},
+    {'power': 'on', 'turbo': 'on'},
+])
+def test_rejected_combinations(device, desired):
+    with pytest.raises(AirConditionException):
+        device.plan_state(desired)
@@ -0,0 +1,79 @@
+"""Coalescing of the per-device command queue."""
+import asyncio
+
+import pytest
+
+from custom_components.zhimi.commands import CommandQueue
+
+
+def make_queue(window=0.02, fail=()):
+    sent = []
+
+    async def send(command, parameters):
+        sent.append((command, parameters))
+        if command in fail:
+            raise OSError("%s failed" % command)
+        return [command, parameters]
+
+    return CommandQueue(send, window), sent
+
+
+def test_only_the_last_value_of_a_command_is_sent():
+    queue, sent = make_queue()
+
+    async def run():
+        return await asyncio.gather(
+            queue.put('set_temperature', [250]),
+            queue.put('set_power', ['on']),
+            queue.put('set_temperature', [260]),
+            queue.put('set_temperature', [270]))
+
+    results = asyncio.run(run())
+    # Every caller receives the result of the value sent.
+    assert results == [['set_temperature', [270]], ['set_power', ['on']],
+                       ['set_temperature', [270]], ['set_temperature', [270]]]
+    assert sent == [('set_power', ['on']), ('set_temperature', [270])]
+    assert queue.coalesced == 2
+
+
+def test_commands_after_a_flush_start_a_new_window():
+    queue, sent = make_queue()
+
+    async def run():
+        await queue.put('set_temperature', [250])
+        await queue.put('set_temperature', [260])
+
+    asyncio.run(run())
+    assert sent == [('set_temperature', [250]), ('set_temperature', [260])]
+    assert queue.coalesced == 0
+
+
+def test_failure_is_raised_to_every_caller_of_the_command():
+    queue, sent = make_queue(fail={'set_mode'})
+
+    async def run():
+        return await asyncio.gather(
+            queue.put('set_mode', ['cool']),
+            queue.put('set_mode', ['heat']),
+            queue.put('set_power', ['on']),
+            return_exceptions=True)
+
+    first, second, power = asyncio.run(run())
+    assert isinstance(first, OSError) and second is first
+    assert power == ['set_power', ['on']]
+    assert sent == [('set_mode', ['heat']), ('set_power', ['on'])]
+
+
+def test_no_window_sends_directly():
+    queue, sent = make_queue(window=0, fail={'set_mode'})
+
+    async def run():
+        assert await queue.put('set_power', ['on']) == ['set_power', ['on']]
+        assert await queue.put('set_power', ['off']) == ['set_power', ['off']]
+        with pytest.raises(OSError):
+            await queue.put('set_mode', ['cool'])
+
+    asyncio.run(run())
+    assert sent == [('set_power', ['on']), ('set_power', ['off']),
+                    ('set_mode', ['cool'])]
+    assert queue.coalesced == 0
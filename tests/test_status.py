@@ -0,0 +1,59 @@
+"""Tiered property cache and pipelined status polls against the simulator."""
+import math
+import time
+
+from custom_components.zhimi.airconditioning import (
+    PROPERTY_TIERS, STATUS_PROPERTIES, AirCondition)
+
+MAX_PROPS = 4
+
+
+def test_status_reads_only_expired_properties(run_fleet):
+    async def test(fleet):
+        host, token, unit, _ = fleet[0]
+        device = AirCondition(host, token)
+        try:
+            await device.async_status()
+            # The first poll probes how many properties the unit answers.
+            assert device._batch_size == MAX_PROPS
+            assert {prop: device._cache[prop] for prop in STATUS_PROPERTIES} == {
+                prop: unit.properties.get(prop) for prop in STATUS_PROPERTIES}
+
+            unit.properties['temp_dec'] = 301
+            unit.properties['st_temp_dec'] = 200
+            requests = unit.requests
+            await device.async_status()
+            assert unit.requests - requests == math.ceil(
+                len(PROPERTY_TIERS['fast']) / MAX_PROPS)
+            assert device._cache['temp_dec'] == 301
+            assert device._cache['st_temp_dec'] != 200
+        finally:
+            device.close()
+
+    run_fleet(test, max_props=MAX_PROPS)
+
+
+def test_expired_status_is_read_by_pipelined_requests(run_fleet):
+    async def test(fleet):
+        host, token, unit, _ = fleet[0]
+        device = AirCondition(host, token, pipeline_window=8)
+        try:
+            await device.async_status()
+            device._fetched_at.clear()
+            unit.properties['st_temp_dec'] = 200
+            unit.latency = 0.05
+
+            requests = unit.requests
+            start = time.monotonic()
+            await device.async_status()
+            elapsed = time.monotonic() - start
+        finally:
+            device.close()
+
+        batches = math.ceil(len(STATUS_PROPERTIES) / MAX_PROPS)
+        assert unit.requests - requests == batches
+        # One after the other the requests would take batches * latency.
+        assert elapsed < (batches - 1) * unit.latency
+        assert device._cache['st_temp_dec'] == 200
+
+    run_fleet(test, max_props=MAX_PROPS)
@@ -0,0 +1,111 @@
+"""Request id matching and retransmission of the asyncio transport."""
+from miio.exceptions import DeviceError
+
+from custom_components.zhimi.transport import HEADER, AsyncMiIOTransport
+
+PROPS = ['p%d' % index for index in range(8)]
+
+
+def make_transport(fleet, timeout=0.2):
+    host, token, unit, _ = fleet[0]
+    for index, prop in enumerate(PROPS):
+        unit.properties[prop] = index
+    return unit, AsyncMiIOTransport(host, token, timeout=timeout)
+
+
+def intercept_requests(unit, intercept):
+    """Call intercept(number) before the unit handles each request packet.
+
+    A falsy return drops the packet.
+    """
+    received = unit.datagram_received
+    count = [0]
+
+    def datagram_received(data, addr):
+        if len(data) != HEADER.size + 16:
+            count[0] += 1
+            if not intercept(count[0]):
+                return
+        received(data, addr)
+
+    unit.datagram_received = datagram_received
+
+
+def test_send_returns_the_result_of_its_reply(run_fleet):
+    async def test(fleet):
+        unit, transport = make_transport(fleet)
+        try:
+            assert await transport.send('get_prop', ['p1', 'p2']) == [1, 2]
+            assert await transport.send('set_power', ['off']) == ['ok']
+            assert unit.properties['power'] == 'off'
+            assert unit.handshakes == 1
+        finally:
+            transport.close()
+
+    run_fleet(test)
+
+
+def test_replies_out_of_order_are_matched_by_id(run_fleet):
+    async def test(fleet):
+        unit, transport = make_transport(fleet)
+        try:
+            results = await transport.send_many(
+                [('get_prop', [prop]) for prop in PROPS], window=len(PROPS))
+        finally:
+            transport.close()
+        return results
+
+    results = run_fleet(test, latency=0.03, jitter=0.03)
+    assert results == [[index] for index in range(len(PROPS))]
+
+
+def test_lost_request_is_retransmitted(run_fleet):
+    async def test(fleet):
+        unit, transport = make_transport(fleet, timeout=0.1)
+        intercept_requests(unit, lambda number: number != 1)
+        try:
+            assert await transport.send('get_prop', ['p3'], retry_count=1) == [3]
+        finally:
+            transport.close()
+        assert transport.metrics.timeouts['get_prop'] == 1
+        assert transport.metrics.retries['get_prop'] == 1
+        assert unit.requests == 1
+
+    run_fleet(test)
+
+
+def test_late_reply_is_not_taken_for_the_retransmission(run_fleet):
+    async def test(fleet):
+        unit, transport = make_transport(fleet, timeout=0.1)
+
+        def answer_late_once(number):
+            # The first reply still carries 'old', but arrives too late.
+            unit.latency = 0.25 if number == 1 else 0
+            unit.properties['p0'] = 'old' if number == 1 else 'new'
+            return True
+
+        intercept_requests(unit, answer_late_once)
+        try:
+            assert await transport.send('get_prop', ['p0'], retry_count=1) == ['new']
+        finally:
+            transport.close()
+
+    run_fleet(test)
+
+
+def test_pipelined_retransmission_affects_only_the_lost_request(run_fleet):
+    async def test(fleet):
+        unit, transport = make_transport(fleet, timeout=0.1)
+        intercept_requests(unit, lambda number: number != 2)
+        try:
+            results = await transport.send_many(
+                [('get_prop', [prop]) for prop in PROPS[:4]]
+                + [('set_unknown', [])], retry_count=1)
+        finally:
+            transport.close()
+        assert results[:4] == [[0], [1], [2], [3]]
+        assert isinstance(results[4], DeviceError)
+        assert transport.metrics.retries['get_prop'] == 1
+        assert transport.metrics.latency['get_prop'].count == 4
+
+    run_fleet(test)